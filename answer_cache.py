@@ -0,0 +1,139 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+
+class AnswerCache:
+    """
+    Cache für Chat-Antworten vor der LLM-Generierung.
+    Sucht zuerst exakt nach der normalisierten Frage, danach semantisch über die
+    Embedding-Ähnlichkeit. Einträge werden per LRU und TTL verdrängt.
+    Der Cache liegt nur im Speicher und lebt so lange wie der Prozess; der Vektorspeicher
+    wird nur beim Start aufgebaut, ein neuer Index beginnt damit immer mit leerem Cache.
+    """
+    def __init__(self, embedding_function=None, max_size=256, ttl_seconds=24 * 3600, similarity_threshold=0.92):
+        self.embedding_function = embedding_function
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def normalize(question):
+        """Normalisiert eine Frage für den exakten Vergleich"""
+        text = re.sub(r'[^\w\s]', ' ', question.lower())
+        return ' '.join(text.split())
+
+    def lookup(self, question, language):
+        """
+        Sucht eine gecachte Antwort.
+        Returns: (Eintrag oder None, Embedding der Frage oder None)
+        """
+        key = self.normalize(question)
+        now = time.time()
+
+        with self.lock:
+            self._evict_expired(now)
+            entry = self.entries.get(key)
+            if entry is not None and entry["language"] == language:
+                self.entries.move_to_end(key)
+                self._record_hit(entry, semantic=False)
+                return entry, entry["embedding"]
+
+        embedding = self._embed(question)
+        if embedding is None:
+            with self.lock:
+                self.misses += 1
+            return None, None
+
+        with self.lock:
+            best_key, best_similarity = None, -1.0
+            for entry_key, entry in self.entries.items():
+                if entry["language"] != language or entry["embedding"] is None:
+                    continue
+                similarity = float(np.dot(entry["embedding"], embedding))
+                if similarity > best_similarity:
+                    best_key, best_similarity = entry_key, similarity
+
+            if best_key is not None and best_similarity >= self.similarity_threshold:
+                entry = self.entries[best_key]
+                self.entries.move_to_end(best_key)
+                self._record_hit(entry, semantic=True)
+                print(f"Semantischer Cache-Treffer (Ähnlichkeit: {best_similarity:.3f})")
+                return entry, embedding
+
+            self.misses += 1
+        return None, embedding
+
+    def store(self, question, language, answer, documents, generation_seconds, embedding=None):
+        """Legt eine generierte Antwort im Cache ab"""
+        key = self.normalize(question)
+        if embedding is None:
+            embedding = self._embed(question)
+
+        with self.lock:
+            self.entries[key] = {
+                "answer": answer,
+                "language": language,
+                "documents": documents,
+                "embedding": embedding,
+                "generation_seconds": generation_seconds,
+                "created_at": time.time()
+            }
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self):
+        """Leert den Cache, z.B. nachdem der Vektorspeicher neu aufgebaut wurde"""
+        with self.lock:
+            self.entries.clear()
+        print("Antwort-Cache invalidiert")
+
+    def stats(self):
+        """Liefert Trefferquote und eingesparte LLM-Zeit"""
+        with self.lock:
+            hits = self.exact_hits + self.semantic_hits
+            lookups = hits + self.misses
+            return {
+                "size": len(self.entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "saved_seconds": self.saved_seconds
+            }
+
+    def format_stats(self):
+        stats = self.stats()
+        return (f"Antwort-Cache: {stats['size']} Einträge, Trefferquote {stats['hit_rate']:.1%} "
+                f"({stats['exact_hits']} exakt, {stats['semantic_hits']} semantisch, {stats['misses']} Fehlschläge), "
+                f"eingesparte LLM-Zeit {stats['saved_seconds']:.1f}s")
+
+    def _record_hit(self, entry, semantic):
+        if semantic:
+            self.semantic_hits += 1
+        else:
+            self.exact_hits += 1
+        self.saved_seconds += entry["generation_seconds"]
+
+    def _evict_expired(self, now):
+        expired = [key for key, entry in self.entries.items() if now - entry["created_at"] > self.ttl_seconds]
+        for key in expired:
+            del self.entries[key]
+
+    def _embed(self, question):
+        if self.embedding_function is None:
+            return None
+        try:
+            return np.asarray(self.embedding_function.embed_query(question), dtype=np.float32)
+        except Exception as e:
+            print(f"Fehler beim Embedding für den Antwort-Cache: {e}")
+            return None
@@ -0,0 +1,128 @@
+import random
+import threading
+from retrieval import fetch_documents
+
+
+class ChunkIndex:
+    """
+    In-Memory-Index aller Chunk-IDs pro source_type.
+    Wird einmal beim Laden aufgebaut; zufällige Stichproben holen danach nur noch
+    die gezogenen IDs aus der Collection statt einer Ähnlichkeitssuche.
+    """
+    def __init__(self, vectorstore):
+        self.vectorstore = vectorstore
+        self.ids_by_source_type = {}
+        self.metadata_by_id = {}
+        self.lock = threading.Lock()
+        self.rebuild()
+
+    def rebuild(self, vectorstore=None):
+        """Liest alle IDs und Metadaten der Collection neu ein"""
+        if vectorstore is not None:
+            self.vectorstore = vectorstore
+        try:
+            result = self.vectorstore._collection.get(include=["metadatas"])
+        except Exception as e:
+            print(f"Fehler beim Aufbau des Chunk-Index: {e}")
+            return
+
+        ids_by_source_type = {}
+        metadata_by_id = {}
+        for chunk_id, metadata in zip(result["ids"], result["metadatas"]):
+            metadata = metadata or {}
+            ids_by_source_type.setdefault(metadata.get('source_type', 'Unknown'), []).append(chunk_id)
+            metadata_by_id[chunk_id] = metadata
+
+        with self.lock:
+            self.ids_by_source_type = ids_by_source_type
+            self.metadata_by_id = metadata_by_id
+
+        summary = ", ".join(f"{source_type}: {len(ids)}" for source_type, ids in ids_by_source_type.items())
+        print(f"Chunk-Index aufgebaut ({summary})")
+
+    def ids(self, source_type=None):
+        """Alle Chunk-IDs, optional auf einen source_type beschränkt"""
+        with self.lock:
+            if source_type is not None:
+                return list(self.ids_by_source_type.get(source_type, []))
+            return list(self.metadata_by_id)
+
+    def metadata(self, chunk_id):
+        return self.metadata_by_id.get(chunk_id, {})
+
+    def sample_ids(self, count, source_type=None):
+        """Zieht gleichverteilt bis zu count Chunk-IDs ohne Zurücklegen"""
+        with self.lock:
+            if source_type is not None:
+                candidates = self.ids_by_source_type.get(source_type, [])
+            else:
+                candidates = list(self.metadata_by_id)
+            return random.sample(candidates, min(count, len(candidates)))
+
+    def get_documents(self, chunk_ids):
+        """Lädt genau die angegebenen Chunks aus der Collection"""
+        return fetch_documents(self.vectorstore, chunk_ids)
+
+    def sample_documents(self, count, source_type=None, coverage=None):
+        if coverage is not None:
+            return self.get_documents(self.sample_ids_with_coverage(count, coverage, source_type))
+        return self.get_documents(self.sample_ids(count, source_type))
+
+    def sample_ids_with_coverage(self, count, coverage, source_type=None):
+        """
+        Zieht Chunk-IDs ohne Zurücklegen bezogen auf die bisherige Nutzung der Sitzung.
+        Seiten mit geringer Abdeckung werden bevorzugt (gewichtete Ziehung nach
+        Efraimidis-Spirakis), pro Ziehung höchstens ein Chunk je Seite.
+        Sind alle Chunks verbraucht, beginnt ein neuer Durchlauf.
+        """
+        with self.lock:
+            if source_type is not None:
+                all_ids = self.ids_by_source_type.get(source_type, [])
+            else:
+                all_ids = list(self.metadata_by_id)
+
+            candidates = [chunk_id for chunk_id in all_ids if chunk_id not in coverage.used_chunk_ids]
+            if not candidates and all_ids:
+                coverage.used_chunk_ids.difference_update(all_ids)
+                candidates = list(all_ids)
+
+            keyed = []
+            for chunk_id in candidates:
+                page_key = coverage.page_key(self.metadata_by_id[chunk_id])
+                weight = 1.0 / (1 + coverage.page_counts.get(page_key, 0))
+                keyed.append((random.random() ** (1.0 / weight), chunk_id, page_key))
+            keyed.sort(reverse=True)
+
+            selected, selected_pages = [], set()
+            for _, chunk_id, page_key in keyed:
+                if page_key in selected_pages:
+                    continue
+                selected.append(chunk_id)
+                selected_pages.add(page_key)
+                if len(selected) >= count:
+                    break
+
+            for chunk_id in selected:
+                coverage.record(chunk_id, self.metadata_by_id[chunk_id])
+            return selected
+
+
+class CoverageTracker:
+    """Merkt sich pro Sitzung, welche Chunks und Seiten bereits für Fragen verwendet wurden"""
+    def __init__(self):
+        self.used_chunk_ids = set()
+        self.page_counts = {}
+
+    @staticmethod
+    def page_key(metadata):
+        return f"{metadata.get('file_name', 'Unknown')}:{metadata.get('page', 'Unknown')}"
+
+    def record(self, chunk_id, metadata):
+        if chunk_id:
+            self.used_chunk_ids.add(chunk_id)
+        page_key = self.page_key(metadata)
+        self.page_counts[page_key] = self.page_counts.get(page_key, 0) + 1
+
+    def record_source(self, source):
+        """Erfasst die Quelle einer Frage, z.B. wenn sie aus der Fragenbank stammt"""
+        self.record(source.get("chunk_id"), {"file_name": source.get("file"), "page": source.get("page")})
@@ -1,22 +1,40 @@
+import hashlib
+import json
+import multiprocessing
 import os
 import pickle
-from langchain_community.document_loaders import PyPDFLoader
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pypdf import PdfReader
+from langchain_core.documents import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
 from tqdm.auto import tqdm
-import torch
+from embedding_cache import CachedEmbeddings, QueryCachedEmbeddings
+from lexical_index import BM25Index
+
+EMBEDDING_BATCH_SIZE = 256
+QUERY_CACHE_SIZE = 1024
+
+
+def load_pdf(pdf_path, source_type):
+    """Lädt eine einzelne PDF und versieht alle Seiten mit Quellen-Metadaten"""
+    from langchain_community.document_loaders import PyPDFLoader
+
+    loader = PyPDFLoader(pdf_path)
+    docs = loader.load()
+
+    for doc in docs:
+        doc.metadata['source_type'] = source_type
+        doc.metadata['file_name'] = os.path.basename(pdf_path)
+
+    return docs
 
 
 def load_pdfs(main_script_path):
     documents = []
     print("Lade Hauptskript...")
-    loader = PyPDFLoader(main_script_path)
-    main_docs = loader.load()
-
-    for doc in main_docs:
-        doc.metadata['source_type'] = 'Hauptskript'
-        doc.metadata['file_name'] = os.path.basename(main_script_path)
+    main_docs = load_pdf(main_script_path, 'Hauptskript')
 
     documents.extend(main_docs)
     print(f"Hauptskript geladen: {len(main_docs)} Seiten")
@@ -24,20 +42,138 @@ def load_pdfs(main_script_path):
     return documents
 
 
-def create_chunks(documents):
-    print("Erstelle Chunks...")
-    text_splitter = RecursiveCharacterTextSplitter(
+def get_text_splitter():
+    return RecursiveCharacterTextSplitter(
         chunk_size=512,
         chunk_overlap=59,
         length_function=len,
         separators=["\n\n", "\n", ".", "!", "?", ",", " ", ""]
     )
+
+
+def create_chunks(documents):
+    print("Erstelle Chunks...")
+    text_splitter = get_text_splitter()
     chunks = text_splitter.split_documents(documents)
     print(f"Chunks erstellt: {len(chunks)} Chunks")
     return chunks
 
 
-def create_vectorstore(chunks, vectorstore_path, metadata_path):
+def _parse_pdf_pages(pdf_path, source_type, start_page, end_page):
+    """Worker-Funktion: parst einen Seitenbereich einer PDF und zerlegt ihn in Chunks"""
+    reader = PdfReader(pdf_path)
+    documents = [
+        Document(
+            page_content=reader.pages[page].extract_text() or "",
+            metadata={
+                'source': pdf_path,
+                'page': page,
+                'source_type': source_type,
+                'file_name': os.path.basename(pdf_path)
+            }
+        )
+        for page in range(start_page, end_page)
+    ]
+    chunks = get_text_splitter().split_documents(documents)
+
+    file_key = hashlib.sha256(os.path.basename(pdf_path).encode('utf-8')).hexdigest()[:8]
+    page_offsets = {}
+    for chunk in chunks:
+        page = chunk.metadata['page']
+        index = page_offsets.get(page, 0)
+        page_offsets[page] = index + 1
+        chunk.metadata['chunk_id'] = f"{source_type}-{file_key}-p{page}-{index}"
+    return chunks
+
+
+def iter_pdf_chunks(pdf_paths, source_type, pages_per_task=16, max_workers=None, failed=None):
+    """
+    Parst PDFs parallel in einem Prozess-Pool (ein Seitenbereich pro Task) und liefert
+    die Chunks in Dokumentreihenfolge, sobald sie fertig sind. Es sind höchstens
+    2 * max_workers Tasks gleichzeitig unterwegs, damit der Speicherbedarf begrenzt bleibt.
+    failed: optionales Set; Fehler einer Datei brechen dann nicht alles ab, sondern die
+    Datei wird eingetragen und ihre restlichen Chunks werden verworfen.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    tasks = []
+    for pdf_path in pdf_paths:
+        try:
+            page_count = len(PdfReader(pdf_path).pages)
+        except Exception as e:
+            if failed is None:
+                raise
+            print(f"Fehler beim Laden von {os.path.basename(pdf_path)}: {e}")
+            failed.add(pdf_path)
+            continue
+        for start_page in range(0, page_count, pages_per_task):
+            tasks.append((pdf_path, source_type, start_page, min(start_page + pages_per_task, page_count)))
+    if not tasks:
+        return
+
+    # spawn statt fork: Der Start läuft parallel zu Threads (Tutor-Init, Gradio), deren
+    # Locks ein geforkter Worker in gesperrtem Zustand erben könnte
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        task_iter = iter(tasks)
+        pending = deque()
+        for task in islice(task_iter, 2 * max_workers):
+            pending.append((task[0], executor.submit(_parse_pdf_pages, *task)))
+
+        while pending:
+            pdf_path, future = pending.popleft()
+            next_task = next(task_iter, None)
+            if next_task is not None:
+                pending.append((next_task[0], executor.submit(_parse_pdf_pages, *next_task)))
+            try:
+                chunks = future.result()
+            except Exception as e:
+                if failed is None:
+                    raise
+                print(f"Fehler beim Laden von {os.path.basename(pdf_path)}: {e}")
+                failed.add(pdf_path)
+                continue
+            if failed is None or pdf_path not in failed:
+                yield from chunks
+
+
+def _batched(iterable, batch_size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _with_embedding_cache(embedding_model, embedding_cache_dir, query_cache_size=QUERY_CACHE_SIZE):
+    """Legt optional den persistenten Embedding-Cache und den Query-LRU-Cache um das Modell"""
+    if embedding_cache_dir is not None:
+        embedding_model = CachedEmbeddings(embedding_model, embedding_cache_dir, "BAAI/bge-m3", normalize=True)
+    return QueryCachedEmbeddings(embedding_model, max_size=query_cache_size)
+
+
+def add_chunks(vectorstore, chunks, lexical_index=None, batch_size=EMBEDDING_BATCH_SIZE):
+    """
+    Bettet Chunks batchweise ein und schreibt sie in die Collection (und den BM25-Index).
+    chunks darf ein Generator sein, es liegt immer nur ein Batch im Speicher.
+    Returns: Anzahl der geschriebenen Chunks
+    """
+    chunk_count = 0
+    with tqdm(desc="Embeddings", unit="Chunks") as progress:
+        for batch in _batched(chunks, batch_size):
+            chunk_ids = [chunk.metadata.get('chunk_id') for chunk in batch]
+            vectorstore.add_documents(batch, ids=chunk_ids if all(chunk_ids) else None)
+            if lexical_index is not None:
+                lexical_index.add_documents(batch)
+            chunk_count += len(batch)
+            progress.update(len(batch))
+    return chunk_count
+
+
+def create_vectorstore(chunks, vectorstore_path, metadata_path, embedding_cache_dir=None, lexical_index=None):
+    import torch
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from langchain_community.vectorstores import Chroma
+
     print("Erstelle Vektorspeicher...")
     device = 'cuda' if torch.cuda.is_available() else 'cpu'
     print(f"Nutze Device: {device}")
@@ -54,18 +190,20 @@ def create_vectorstore(chunks, vectorstore_path, metadata_path):
             'batch_size': 128
     }
 )
+    embedding_model = _with_embedding_cache(embedding_model, embedding_cache_dir)
 
     print("Erstelle Embeddings und Vektorspeicher...")
-    vectorstore = Chroma.from_documents(
-        documents=chunks,
-        embedding=embedding_model,
+    vectorstore = Chroma(
+        embedding_function=embedding_model,
         persist_directory=vectorstore_path,
         collection_metadata={"hnsw:space": "cosine"}
     )
 
+    chunk_count = add_chunks(vectorstore, chunks, lexical_index)
+
     metadata = {
-        'main_script_count': len(chunks),
-        'total_count': len(chunks),
+        'main_script_count': chunk_count,
+        'total_count': chunk_count,
         'model_name': 'BAAI/bge-m3',
         'chunk_size': 512,
         'chunk_overlap': 50,
@@ -86,7 +224,11 @@ def create_vectorstore(chunks, vectorstore_path, metadata_path):
     return vectorstore, metadata
 
 
-def load_vectorstore(vectorstore_path, metadata_path, chunks=None):
+def load_vectorstore(vectorstore_path, metadata_path, chunks=None, embedding_cache_dir=None, lexical_index=None):
+    import torch
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from langchain_community.vectorstores import Chroma
+
     try:
         print("Lade Vektorspeicher...")
         device = 'cuda' if torch.cuda.is_available() else 'cpu'
@@ -102,6 +244,7 @@ def load_vectorstore(vectorstore_path, metadata_path, chunks=None):
                 'batch_size': 64
             }
         )
+        embedding_model = _with_embedding_cache(embedding_model, embedding_cache_dir)
 
         vectorstore = Chroma(
             persist_directory=vectorstore_path,
@@ -123,6 +266,163 @@ def load_vectorstore(vectorstore_path, metadata_path, chunks=None):
         print(f"Fehler beim Laden: {e}")
         if chunks is not None:
             print("Erstelle neuen Vektorspeicher...")
-            return create_vectorstore(chunks, vectorstore_path, metadata_path)
+            return create_vectorstore(chunks, vectorstore_path, metadata_path, embedding_cache_dir, lexical_index)
         else:
-            raise e
\ No newline at end of file
+            raise e
+
+
+def backfill_chunk_ids(vectorstore, batch_size=EMBEDDING_BATCH_SIZE):
+    """
+    Setzt metadata['chunk_id'] auf die Chroma-ID, wo sie fehlt oder abweicht (ältere
+    Vektorspeicher mit UUID-IDs). Dichte Treffer und BM25-Treffer tragen danach denselben
+    Schlüssel, sodass ein Chunk in der Fusion nicht doppelt auftaucht.
+    """
+    result = vectorstore._collection.get(include=["metadatas"])
+    stale = [
+        (chunk_id, dict(metadata or {}, chunk_id=chunk_id))
+        for chunk_id, metadata in zip(result["ids"], result["metadatas"])
+        if (metadata or {}).get('chunk_id') != chunk_id
+    ]
+    if not stale:
+        return
+    print(f"Ergänze chunk_id für {len(stale)} Chunks...")
+    for start in range(0, len(stale), batch_size):
+        batch = stale[start:start + batch_size]
+        vectorstore._collection.update(
+            ids=[chunk_id for chunk_id, _ in batch],
+            metadatas=[metadata for _, metadata in batch]
+        )
+
+
+def load_lexical_index(index_path, vectorstore):
+    """
+    Lädt den BM25-Index neben dem Vektorspeicher. Fehlt er oder passt die Anzahl der
+    Chunks nicht zur Collection, wird er einmalig aus der Collection neu aufgebaut.
+    """
+    lexical_index = BM25Index.load(index_path)
+    collection_size = vectorstore._collection.count()
+    if lexical_index is not None and len(lexical_index) == collection_size:
+        print(f"BM25-Index geladen mit {len(lexical_index)} Chunks")
+        return lexical_index
+
+    backfill_chunk_ids(vectorstore)
+    print("Baue BM25-Index aus dem Vektorspeicher auf...")
+    lexical_index = BM25Index.from_collection(vectorstore)
+    lexical_index.save(index_path)
+    return lexical_index
+
+
+def file_content_hash(file_path):
+    """Berechnet den SHA-256-Hash des Dateiinhalts"""
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def load_manifest(manifest_path):
+    """Lädt das Manifest der bereits indexierten Dateien"""
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Fehler beim Laden des Manifests: {e}")
+        return {}
+
+
+def save_manifest(manifest, manifest_path):
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def _delete_chunks(vectorstore, chunk_ids, lexical_index=None):
+    """
+    Löscht Chunks aus Collection und BM25-Index. Eine leere ID-Liste (z.B. gescannte PDF
+    ohne Text) wird übersprungen: Je nach Chroma-Version wirft delete(ids=[]) einen Fehler
+    oder wirkt wie ein Löschen ohne Filter.
+    """
+    if not chunk_ids:
+        return
+    vectorstore.delete(ids=chunk_ids)
+    if lexical_index is not None:
+        lexical_index.remove(chunk_ids)
+
+
+def ingest_directory(vectorstore, directory, manifest_path, source_type, lexical_index=None):
+    """
+    Indexiert alle PDFs eines Verzeichnisses inkrementell.
+    Nur neue oder geänderte Dateien werden eingebettet, die Chunks entfernter
+    Dateien werden aus der Collection gelöscht. Ein übergebener BM25-Index wird
+    entsprechend mitgeführt.
+    """
+    manifest = load_manifest(manifest_path)
+    changes = {"added": [], "updated": [], "removed": []}
+
+    if not os.path.isdir(directory):
+        print(f"Verzeichnis nicht gefunden: {directory}")
+        return changes
+
+    current_files = {
+        file_name: os.path.join(directory, file_name)
+        for file_name in sorted(os.listdir(directory))
+        if file_name.lower().endswith('.pdf')
+    }
+
+    for file_name in [name for name, entry in manifest.items()
+                      if entry.get('source_type') == source_type and name not in current_files]:
+        _delete_chunks(vectorstore, manifest[file_name]['chunk_ids'], lexical_index)
+        del manifest[file_name]
+        changes["removed"].append(file_name)
+        print(f"Entfernt: {file_name}")
+
+    changed = {}
+    for file_name, file_path in tqdm(current_files.items(), desc=f"Prüfe {source_type}"):
+        content_hash = file_content_hash(file_path)
+        entry = manifest.get(file_name)
+        if entry and entry['hash'] == content_hash:
+            continue
+
+        if entry:
+            _delete_chunks(vectorstore, entry['chunk_ids'], lexical_index)
+        changed[file_path] = (file_name, content_hash, entry is not None)
+
+    if changed:
+        # Alle geänderten Dateien laufen durch einen Prozess-Pool und denselben Batch-Pfad
+        # wie create_vectorstore; die IDs hängen vom Dateiinhalt ab
+        chunk_ids = {file_path: [] for file_path in changed}
+        failed = set()
+
+        def numbered_chunks():
+            for chunk in iter_pdf_chunks(list(changed), source_type, failed=failed):
+                file_path = chunk.metadata['source']
+                ids = chunk_ids[file_path]
+                chunk.metadata['chunk_id'] = f"{source_type}-{changed[file_path][1][:16]}-{len(ids)}"
+                ids.append(chunk.metadata['chunk_id'])
+                yield chunk
+
+        add_chunks(vectorstore, numbered_chunks(), lexical_index)
+
+        for file_path, (file_name, content_hash, existed) in changed.items():
+            if file_path in failed:
+                # Bereits geschriebene Chunks verwerfen, beim nächsten Start wird die Datei erneut versucht
+                _delete_chunks(vectorstore, chunk_ids[file_path], lexical_index)
+                manifest.pop(file_name, None)
+                continue
+
+            manifest[file_name] = {
+                'hash': content_hash,
+                'source_type': source_type,
+                'chunk_ids': chunk_ids[file_path]
+            }
+            changes["updated" if existed else "added"].append(file_name)
+            print(f"Indexiert: {file_name} ({len(chunk_ids[file_path])} Chunks)")
+
+    save_manifest(manifest, manifest_path)
+    print(f"{source_type}: {len(changes['added'])} neu, {len(changes['updated'])} geändert, "
+          f"{len(changes['removed'])} entfernt")
+    return changes
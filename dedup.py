@@ -0,0 +1,83 @@
+import re
+import threading
+import zlib
+import numpy as np
+
+_MERSENNE_PRIME = (1 << 31) - 1
+
+
+def normalize_question_text(text):
+    """Entfernt Fortschrittspräfixe wie 'Frage 1 von 3' und vereinheitlicht Schreibweise"""
+    if "\n\n" in text:
+        text = text.split("\n\n", 1)[1]
+    text = re.sub(r'[^\w\s]', ' ', text.lower())
+    return ' '.join(text.split())
+
+
+class QuestionDedupIndex:
+    """
+    Index zur Erkennung nahezu identischer Fragen über MinHash-Signaturen auf
+    Zeichen-Shingles. Über LSH-Bänder werden nur Kandidaten mit gemeinsamem Bucket
+    verglichen, sodass eine Abfrage auch bei tausenden Fragen annähernd konstant bleibt.
+    """
+    def __init__(self, threshold=0.6, num_perm=128, bands=32, shingle_size=4, seed=42):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, _MERSENNE_PRIME, size=num_perm, dtype=np.int64)
+        self.b = rng.randint(0, _MERSENNE_PRIME, size=num_perm, dtype=np.int64)
+        self.buckets = [{} for _ in range(bands)]
+        self.signatures = {}
+        self.lock = threading.Lock()
+
+    def __deepcopy__(self, memo):
+        # gr.State kopiert den Startwert pro Sitzung; der Lock lässt sich nicht kopieren
+        copy = QuestionDedupIndex(self.threshold, self.num_perm, self.bands, self.shingle_size)
+        copy.a, copy.b = self.a, self.b
+        with self.lock:
+            copy.signatures = dict(self.signatures)
+            copy.buckets = [{key: set(members) for key, members in bucket.items()} for bucket in self.buckets]
+        return copy
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def signature(self, text):
+        text = normalize_question_text(text)
+        if len(text) <= self.shingle_size:
+            shingles = {text}
+        else:
+            shingles = {text[i:i + self.shingle_size] for i in range(len(text) - self.shingle_size + 1)}
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) & _MERSENNE_PRIME for s in shingles), dtype=np.int64)
+        return ((self.a[:, None] * hashes[None, :] + self.b[:, None]) % _MERSENNE_PRIME).min(axis=1)
+
+    def _band_keys(self, signature):
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def add(self, key, text):
+        signature = self.signature(text)
+        with self.lock:
+            self.signatures[key] = signature
+            for bucket, band_key in zip(self.buckets, self._band_keys(signature)):
+                bucket.setdefault(band_key, set()).add(key)
+
+    def find_duplicate(self, text):
+        """
+        Sucht eine gespeicherte Frage mit geschätzter Jaccard-Ähnlichkeit über dem Schwellwert.
+        Returns: (Schlüssel, Ähnlichkeit) oder None
+        """
+        signature = self.signature(text)
+        with self.lock:
+            candidates = set()
+            for bucket, band_key in zip(self.buckets, self._band_keys(signature)):
+                candidates.update(bucket.get(band_key, ()))
+
+            best = None
+            for key in candidates:
+                similarity = float(np.mean(self.signatures[key] == signature))
+                if similarity >= self.threshold and (best is None or similarity > best[1]):
+                    best = (key, similarity)
+        return best
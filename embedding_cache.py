@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Persistenter Embedding-Cache um ein Embedding-Modell.
+    Die Vektoren liegen als float32-Array in einer memory-mapped Datei, ein JSON-Index
+    ordnet jedem Chunk-Text-Hash seine Zeile zu. Modellname und Normalisierung bilden
+    den Namensraum, sodass ein Modellwechsel nie alte Vektoren liefert.
+    """
+    def __init__(self, embeddings, cache_dir, model_name, normalize=True):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.normalize = normalize
+        namespace = text_hash(f"{model_name}|normalize={normalize}")[:16]
+        os.makedirs(cache_dir, exist_ok=True)
+        self.vectors_path = os.path.join(cache_dir, f"{namespace}.f32")
+        self.index_path = os.path.join(cache_dir, f"{namespace}.json")
+        self.lock = threading.Lock()
+        self.dim = None
+        self.rows = {}
+        self.vectors = None
+        self._load()
+
+    def _load(self):
+        if not (os.path.exists(self.index_path) and os.path.exists(self.vectors_path)):
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            self.dim = index["dim"]
+            self.rows = index["rows"]
+            self._open_vectors()
+            print(f"Embedding-Cache geladen: {len(self.rows)} Vektoren")
+        except Exception as e:
+            print(f"Fehler beim Laden des Embedding-Caches: {e}")
+            self.dim, self.rows, self.vectors = None, {}, None
+
+    def _open_vectors(self):
+        row_count = os.path.getsize(self.vectors_path) // (4 * self.dim)
+        if len(self.rows) > row_count:
+            raise ValueError("Embedding-Index verweist auf fehlende Vektoren")
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(row_count, self.dim)) if row_count else None
+
+    def _append(self, hashes, vectors):
+        """Hängt neue Vektoren an die Datei an und aktualisiert den Index (Lock muss gehalten werden)"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+
+        start_row = len(self.rows)
+        with open(self.vectors_path, 'r+b' if os.path.exists(self.vectors_path) else 'wb') as f:
+            f.seek(start_row * 4 * self.dim)
+            f.write(vectors.tobytes())
+            f.truncate()
+        for offset, hash_value in enumerate(hashes):
+            self.rows[hash_value] = start_row + offset
+
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"model_name": self.model_name, "normalize": self.normalize, "dim": self.dim, "rows": self.rows}, f)
+        os.replace(tmp_path, self.index_path)
+        self._open_vectors()
+
+    def embed_documents(self, texts):
+        hashes = [text_hash(text) for text in texts]
+
+        with self.lock:
+            missing = {}
+            for hash_value, text in zip(hashes, texts):
+                if hash_value not in self.rows and hash_value not in missing:
+                    missing[hash_value] = text
+
+            if missing:
+                print(f"Embedding-Cache: {len(texts) - len(missing)} Treffer, {len(missing)} neu zu berechnen")
+                new_vectors = self.embeddings.embed_documents(list(missing.values()))
+                self._append(list(missing.keys()), new_vectors)
+
+            return [self.vectors[self.rows[hash_value]].tolist() for hash_value in hashes]
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+
+class QueryCachedEmbeddings(Embeddings):
+    """
+    Begrenzter LRU-Cache für Query-Embeddings. Liegt um die Embedding-Funktion des
+    Vektorspeichers, damit alle Aufrufer (Chat, Fragengenerierung, Antwortprüfung)
+    identische Texte nur einmal einbetten.
+    """
+    def __init__(self, embeddings, max_size=1024):
+        self.embeddings = embeddings
+        self.max_size = max_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        with self.lock:
+            vector = self.cache.get(text)
+            if vector is not None:
+                self.cache.move_to_end(text)
+                self.hits += 1
+                return list(vector)
+            self.misses += 1
+
+        vector = self.embeddings.embed_query(text)
+
+        with self.lock:
+            self.cache[text] = tuple(vector)
+            self.cache.move_to_end(text)
+            while len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+        return list(vector)
+
+    def stats(self):
+        """Liefert Treffer- und Fehlschlagzähler des Query-Caches"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
@@ -1,30 +1,62 @@
+import asyncio
 import gradio as gr
 import random
+from concurrent.futures import Future, ThreadPoolExecutor
 from question_generator import QuestionGenerator
 from answer_handler import AnswerHandler
 from ui_components import create_tabs
 from styles import get_css_styles
 from utils import format_choices, get_question_type_code
 from language_utils import get_error_message
+from llm_client import LLMOverloadedError
+from session_state import TrainerSession
+
+def _resolve(value):
+    """Wartet auf ein Future aus dem Hintergrundstart, andere Werte werden direkt zurückgegeben"""
+    if isinstance(value, Future):
+        return value.result()
+    return value
 
 class GradioInterface:
-    def __init__(self, tutor):
-        self.tutor = tutor
-        self.current_question = {
-            "options": {},
-            "correct_answers": [],
-            "selected_answers": []
-        }
-        self.question_language = "de"  
-        self.attempt_count = 0  
+    def __init__(self, tutor, generation_concurrency=3, question_bank=None, generation_requests=2):
+        """
+        tutor und question_bank können auch Futures sein, wenn sie im Hintergrund geladen werden.
+        generation_requests begrenzt, wie viele Fragenrunden gleichzeitig laufen; weitere warten,
+        ohne Threads des Standard-Executors von asyncio zu belegen.
+        """
+        self._tutor = tutor
+        self._question_bank = question_bank
+        self._question_generator = None
+        self.generation_concurrency = max(1, int(generation_concurrency))
+        self.generation_executor = ThreadPoolExecutor(
+            max_workers=max(1, int(generation_requests)),
+            thread_name_prefix="question-generation"
+        )
         self.max_attempts = 3  
-        self.question_queue = []  
-        self.current_question_index = 0  
-        self.total_questions = 0  
-        self.active_output = "auto"
-        self.question_generator = QuestionGenerator(self)
         self.answer_handler = AnswerHandler(self)
 
+    @property
+    def tutor(self):
+        return _resolve(self._tutor)
+
+    @property
+    def question_bank(self):
+        return _resolve(self._question_bank)
+
+    @property
+    def question_generator(self):
+        if self._question_generator is None:
+            question_bank = self.question_bank
+            if question_bank is not None:
+                self._question_generator = question_bank.question_generator
+            else:
+                self._question_generator = QuestionGenerator(self.tutor)
+        return self._question_generator
+
+    def is_ready(self):
+        """Prüft, ob der Tutor bereits vollständig initialisiert ist"""
+        return not isinstance(self._tutor, Future) or self._tutor.done()
+
     def create_interface(self):
         with gr.Blocks(title="Business Software 2 Tutor") as demo:
             with gr.Row():
@@ -38,90 +70,154 @@ class GradioInterface:
 
             return demo
 
-    def set_question_language(self, language):
-        self.question_language = "de" if language == "Deutsch" else "en"
-        return None
+    def set_question_language(self, language, session):
+        session.question_language = "de" if language == "Deutsch" else "en"
+        return session
 
-    def ask_question(self, message, history):
+    async def ask_question(self, message, history, request: gr.Request = None):
+        """Chat-Handler; Gradio übergibt request anhand der Annotation, die session_hash dient dem Scheduler als Sitzungskennung"""
+        session_id = request.session_hash if request is not None else None
         try:
-            response = self.tutor.ask_question(message)
-            return response
+            if not self.is_ready():
+                yield "Der Tutor wird noch initialisiert, bitte einen Moment Geduld..."
+                await asyncio.wrap_future(self._tutor)
+            async for partial_response in self.tutor.ask_question_stream_async(message, session_id=session_id):
+                yield partial_response
         except Exception as e:
-            return f"Fehler bei der Verarbeitung der Frage: {str(e)}"
+            yield f"Fehler bei der Verarbeitung der Frage: {str(e)}"
+
+    def _generate_single_question(self, session, question_type, topic, index, previous_questions):
+        """
+        Generiert eine einzelne Frage; wird parallel im Thread-Pool ausgeführt.
+        Ist das LLM überlastet, wird LLMOverloadedError weitergereicht, damit die Runde endet.
+        """
+        if topic:
+            q_type_code = get_question_type_code(question_type)
+
+            if index > 0:
+                current_topic = self.question_generator.generate_question_variation(
+                    session,
+                    topic,
+                    q_type_code,
+                    previous_questions
+                )
+            else:
+                current_topic = topic
+
+            print(f"Generiere Frage zu: {current_topic}")
+            question_data = self.question_generator.generate_question_with_language(
+                session,
+                current_topic,
+                q_type_code,
+                previous_questions
+            )
+            if question_data.get("overloaded"):
+                raise LLMOverloadedError(question_data["error"])
+            if "error" in question_data:
+                return None
+            question_data["question_type"] = question_type
+        else:
+            question_data = self.question_generator.generate_random_question_internal(session, question_type)
+            if question_data.get("overloaded"):
+                raise LLMOverloadedError(question_data["error"])
 
-    def generate_questions(self, question_type, count, topic=None):
-        """Generiert mehrere Fragen und speichert sie in der Queue
+        if "options" in question_data and question_data["options"] and len(question_data["options"]) >= 2:
+            return question_data
+        return None
+
+    async def generate_questions(self, question_type, count, topic=None, session=None):
+        """
+        Asynchroner Handler für die Fragengenerierung. Die Generierung selbst läuft im
+        eigenen, begrenzten Executor, sodass die Event-Loop von Gradio währenddessen frei bleibt.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.generation_executor,
+            self.generate_questions_sync, question_type, count, topic, session
+        )
+
+    def generate_questions_sync(self, question_type, count, topic=None, session=None):
+        """Generiert mehrere Fragen und speichert sie in der Queue der Sitzung
 
         Args:
             question_type: Art der Frage (MC oder SC)
             count: Anzahl der zu generierenden Fragen
             topic: Optional - wenn angegeben, werden Fragen zu diesem Thema generiert
+            session: TrainerSession des aktuellen Nutzers
         """
-        self.question_queue = []
-        self.current_question_index = 0
-        self.total_questions = int(count)
-        self.attempt_count = 0
-        self.active_output = "eigene" if topic else "auto"
-        successful_questions = 0
-        max_attempts = self.total_questions * 2
+        if session is None:
+            session = TrainerSession()
+        if topic is not None and not topic.strip():
+            error_msg = get_error_message(session.question_language, "empty_topic")
+            return error_msg, gr.update(visible=False), gr.update(choices=[]), "", 0, gr.update(visible=False), gr.update(visible=False), session
+
+        session.reset_queue(count, "eigene" if topic else "auto")
+        max_attempts = session.total_questions * 2
         attempts = 0
-
-        while successful_questions < self.total_questions and attempts < max_attempts:
-            attempts += 1
-            try:
-                if topic:
-                    if not topic.strip():
-                        error_msg = get_error_message(self.question_language, "empty_topic")
-                        return error_msg, gr.update(visible=False), gr.update(choices=[]), "", 0, gr.update(visible=False), gr.update(visible=False)
-
-                    q_type_code = get_question_type_code(question_type)
-
-                    if successful_questions > 0:
-                        current_topic = self.question_generator.generate_question_variation(
-                            topic,
-                            q_type_code,
-                            self.question_queue
-                        )
-                    else:
-                        current_topic = topic
-
-                    print(f"Generiere Frage zu: {current_topic}")
-                    question_data = self.question_generator.generate_question_with_language(
-                        current_topic,
-                        q_type_code
+        overloaded = False
+
+        if not topic and self.question_bank is not None:
+            banked_questions = self.question_bank.take(
+                session.question_language,
+                question_type,
+                session.total_questions,
+                accept=lambda question_data: self.question_generator.is_question_unique(session, question_data)
+            )
+            for question_data in banked_questions:
+                session.add_to_queue(question_data)
+                if question_data.get("source"):
+                    session.coverage.record_source(question_data["source"])
+            if banked_questions:
+                print(f"{len(banked_questions)} Fragen aus der Fragenbank geladen")
+
+        with ThreadPoolExecutor(max_workers=self.generation_concurrency) as executor:
+            while not overloaded and len(session.question_queue) < session.total_questions and attempts < max_attempts:
+                needed = min(session.total_questions - len(session.question_queue), max_attempts - attempts)
+                futures = [
+                    executor.submit(
+                        self._generate_single_question,
+                        session,
+                        question_type,
+                        topic,
+                        len(session.question_queue) + i,
+                        list(session.question_queue)
                     )
-
-                    if "error" not in question_data and "options" in question_data and question_data["options"] and len(question_data["options"]) >= 2:
-                        question_data["question_type"] = question_type
-                        self.question_queue.append(question_data)
-                        successful_questions += 1
-                else:
-                    question_data = self.question_generator.generate_random_question_internal(question_type)
-                    if "options" in question_data and question_data["options"] and len(question_data["options"]) >= 2:
-                        self.question_queue.append(question_data)
-                        successful_questions += 1
-            except Exception as e:
-                print(f"Fehler bei der Fragengenerierung: {e}")
-                continue
-
-        self.total_questions = len(self.question_queue)
-
-        if self.question_queue:
-            question_data = self.question_queue[0]
-            self.current_question["options"] = question_data["options"]
-            self.current_question["correct_answers"] = self.tutor.last_correct_answers
-            q_type = get_question_type_code(question_data.get("question_type", "Multiple Choice (MC)"))
-            self.current_question["question_type"] = q_type
-
-            progress = f"Frage 1 von {self.total_questions}" if self.question_language == "de" else f"Question 1 of {self.total_questions}"
+                    for i in range(needed)
+                ]
+                attempts += needed
+
+                for future in futures:
+                    if future.cancelled():
+                        continue
+                    try:
+                        question_data = future.result()
+                    except LLMOverloadedError:
+                        # Überlastung: keine weiteren Versuche, noch nicht gestartete Aufgaben verwerfen
+                        overloaded = True
+                        for pending in futures:
+                            pending.cancel()
+                        continue
+                    except Exception as e:
+                        print(f"Fehler bei der Fragengenerierung: {e}")
+                        continue
+
+                    if question_data is None or len(session.question_queue) >= session.total_questions:
+                        continue
+                    if self.question_generator.is_question_unique(session, question_data):
+                        session.add_to_queue(question_data)
+
+        session.total_questions = len(session.question_queue)
+
+        if session.question_queue:
+            question_data = session.question_queue[0]
+            session.load_question(question_data)
+
+            progress = f"Frage 1 von {session.total_questions}" if session.question_language == "de" else f"Question 1 of {session.total_questions}"
             question_text = f"{progress}\n\n{question_data['question_text']}"
 
             choices = format_choices(question_data["options"])
 
-            if self.active_output == "auto":
-                return question_text, gr.update(visible=True), gr.update(choices=choices, value=[]), "", 0, gr.update(visible=True, value=progress), gr.update(visible=False)
-            else:
-                return question_text, gr.update(visible=True), gr.update(choices=choices, value=[]), "", 0, gr.update(visible=True, value=progress), gr.update(visible=False)
+            return question_text, gr.update(visible=True), gr.update(choices=choices, value=[]), "", 0, gr.update(visible=True, value=progress), gr.update(visible=False), session
         else:
-            error_msg = get_error_message(self.question_language, "question_generation")
-            return error_msg, gr.update(visible=False), gr.update(choices=[]), "", 0, gr.update(visible=False), gr.update(visible=False)
\ No newline at end of file
+            error_msg = get_error_message(session.question_language, "overloaded" if overloaded else "question_generation")
+            return error_msg, gr.update(visible=False), gr.update(choices=[]), "", 0, gr.update(visible=False), gr.update(visible=False), session
\ No newline at end of file
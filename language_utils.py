@@ -27,14 +27,24 @@ def detect_language(text):
     else:
         return 'en'
 
+def format_answer_by_language(language, answer):
+    """
+    Formatiert eine (ggf. noch unvollständige) Antwort ohne Quellenangaben
+    """
+    if language == 'de':
+        return f"\nAntwort: {answer}"
+    else:
+        return f"\nAnswer: {answer}"
+
 def format_response_by_language(language, answer, documents, source_label):
     """
     Formatiert die Antwort mit Quellenangaben basierend auf der erkannten Sprache
     """
+    response = format_answer_by_language(language, answer)
     if language == 'de':
-        response = f"\nAntwort: {answer}\n\nQuellen ({source_label}):"
+        response += f"\n\nQuellen ({source_label}):"
     else: 
-        response = f"\nAnswer: {answer}\n\nSources ({source_label}):"
+        response += f"\n\nSources ({source_label}):"
 
     for i, doc in enumerate(documents):
         source_type = doc.metadata.get('source_type', 'Unknown' if language == 'en' else 'Unbekannt')
@@ -95,9 +105,17 @@ def get_error_message(language, error_type):
             "de": "Keine Dokumente im Vektorspeicher gefunden",
             "en": "No documents found in vector store"
         },
+        "duplicate_question": {
+            "de": "Die generierte Frage wurde bereits gestellt",
+            "en": "The generated question has already been asked"
+        },
         "empty_topic": {
             "de": "Bitte geben Sie ein Thema ein",
             "en": "Please enter a topic"
+        },
+        "overloaded": {
+            "de": "Der Tutor ist gerade stark ausgelastet, bitte versuchen Sie es gleich noch einmal",
+            "en": "The tutor is currently overloaded, please try again in a moment"
         }
     }
 
@@ -0,0 +1,168 @@
+import math
+import os
+import pickle
+import re
+import threading
+
+_TOKEN_PATTERN = re.compile(r'\w+')
+INDEX_VERSION = 2
+
+
+def tokenize(text):
+    """Zerlegt Text in kleingeschriebene Wort-Tokens (Akronyme wie OLAP bleiben erhalten)"""
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if len(token) > 1 or token.isdigit()]
+
+
+class BM25Index:
+    """
+    Invertierter Index über alle Chunks für lexikalische Suche nach BM25.
+    Pro Term wird nur eine Posting-Liste {Dokumentnummer: Termhäufigkeit} gehalten,
+    sodass eine Abfrage nur die Chunks berührt, die einen der Suchbegriffe enthalten.
+    Chunks lassen sich inkrementell hinzufügen und entfernen (Zusatz-Ingestion).
+    """
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.chunk_ids = []
+        self.source_types = []
+        self.lengths = []
+        self.terms = []
+        self.position_by_id = {}
+        self.postings = {}
+        self.total_length = 0
+        self.dirty = False
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.position_by_id)
+
+    def add(self, chunk_id, text, source_type=None):
+        """Indexiert einen Chunk; ein bereits vorhandener Chunk mit gleicher ID wird ersetzt"""
+        tokens = tokenize(text)
+        frequencies = {}
+        for token in tokens:
+            frequencies[token] = frequencies.get(token, 0) + 1
+
+        with self.lock:
+            self._remove(chunk_id)
+            position = len(self.chunk_ids)
+            self.chunk_ids.append(chunk_id)
+            self.source_types.append(source_type)
+            self.lengths.append(len(tokens))
+            self.terms.append(list(frequencies))
+            self.position_by_id[chunk_id] = position
+            self.total_length += len(tokens)
+            for token, frequency in frequencies.items():
+                self.postings.setdefault(token, {})[position] = frequency
+            self.dirty = True
+
+    def add_documents(self, documents):
+        for document in documents:
+            chunk_id = document.metadata.get('chunk_id')
+            if chunk_id:
+                self.add(chunk_id, document.page_content, document.metadata.get('source_type'))
+
+    def remove(self, chunk_ids):
+        with self.lock:
+            for chunk_id in chunk_ids:
+                self._remove(chunk_id)
+
+    def _remove(self, chunk_id):
+        """Entfernt einen Chunk aus den Posting-Listen (Lock muss gehalten werden)"""
+        position = self.position_by_id.pop(chunk_id, None)
+        if position is None:
+            return
+        self.total_length -= self.lengths[position]
+        self.chunk_ids[position] = None
+        self.lengths[position] = 0
+        for token in self.terms[position]:
+            postings = self.postings.get(token)
+            if postings is not None and postings.pop(position, None) is not None and not postings:
+                del self.postings[token]
+        self.terms[position] = []
+        self.dirty = True
+
+    def search(self, query, k=10, source_type=None):
+        """
+        Sucht die k Chunks mit dem höchsten BM25-Score.
+        Returns: Liste von (chunk_id, score), absteigend sortiert
+        """
+        with self.lock:
+            document_count = len(self.position_by_id)
+            if document_count == 0:
+                return []
+            average_length = self.total_length / document_count
+
+            scores = {}
+            for token in set(tokenize(query)):
+                postings = self.postings.get(token)
+                if not postings:
+                    continue
+                idf = math.log(1 + (document_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for position, frequency in postings.items():
+                    if source_type is not None and self.source_types[position] != source_type:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self.lengths[position] / average_length)
+                    scores[position] = scores.get(position, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+            return [(self.chunk_ids[position], score) for position, score in ranked]
+
+    def save(self, path):
+        """Speichert den Index atomar; freie Positionen entfernter Chunks werden dabei kompaktiert"""
+        with self.lock:
+            live = [position for position, chunk_id in enumerate(self.chunk_ids) if chunk_id is not None]
+            remap = {old: new for new, old in enumerate(live)}
+            state = {
+                "version": INDEX_VERSION,
+                "k1": self.k1,
+                "b": self.b,
+                "chunk_ids": [self.chunk_ids[position] for position in live],
+                "source_types": [self.source_types[position] for position in live],
+                "lengths": [self.lengths[position] for position in live],
+                "postings": {
+                    token: {remap[position]: frequency for position, frequency in postings.items()}
+                    for token, postings in self.postings.items()
+                }
+            }
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+            self.dirty = False
+
+    @classmethod
+    def load(cls, path):
+        """Lädt einen gespeicherten Index. Returns: BM25Index oder None bei fehlender/inkompatibler Datei"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                state = pickle.load(f)
+            if state.get("version") != INDEX_VERSION:
+                return None
+        except Exception as e:
+            print(f"Fehler beim Laden des BM25-Index: {e}")
+            return None
+
+        index = cls(state["k1"], state["b"])
+        index.chunk_ids = state["chunk_ids"]
+        index.source_types = state["source_types"]
+        index.lengths = state["lengths"]
+        index.postings = state["postings"]
+        index.position_by_id = {chunk_id: position for position, chunk_id in enumerate(index.chunk_ids)}
+        index.terms = [[] for _ in index.chunk_ids]
+        for token, postings in index.postings.items():
+            for position in postings:
+                index.terms[position].append(token)
+        index.total_length = sum(index.lengths)
+        return index
+
+    @classmethod
+    def from_collection(cls, vectorstore):
+        """Baut den Index aus allen Chunks der Chroma-Collection auf"""
+        index = cls()
+        result = vectorstore._collection.get(include=["documents", "metadatas"])
+        for chunk_id, text, metadata in zip(result["ids"], result["documents"], result["metadatas"]):
+            index.add(chunk_id, text or "", (metadata or {}).get('source_type'))
+        return index
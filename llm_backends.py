@@ -0,0 +1,90 @@
+import asyncio
+import hashlib
+import json
+import time
+import httpx
+
+
+def create_ollama_llm(model, max_connections=8, **kwargs):
+    """Erstellt ein OllamaLLM mit gepooltem HTTP-Client (Keep-Alive-Verbindungen zum Ollama-Server)"""
+    from langchain_ollama import OllamaLLM
+
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    return OllamaLLM(model=model, client_kwargs={"limits": limits}, **kwargs)
+
+
+class StubLLM:
+    """
+    Deterministisches In-Process-LLM für Tests und Lasttests ohne laufenden Ollama-Server.
+    Gleicher Prompt liefert immer dieselbe Antwort; mit format (JSON-Schema) wird ein
+    schemakonformes JSON erzeugt. latency_seconds simuliert die Generierungsdauer.
+    """
+    def __init__(self, model="stub", latency_seconds=0.0, format=None, **kwargs):
+        self.model = model
+        self.latency_seconds = latency_seconds
+        self.format = format
+
+    def _respond(self, prompt):
+        digest = hashlib.sha256(f"{self.model}\n{prompt}".encode('utf-8')).hexdigest()
+        if isinstance(self.format, dict):
+            return json.dumps(self._example(self.format, self.format.get("$defs", {}), digest, "value"), ensure_ascii=False)
+        return f"Stub-Antwort {digest[:16]}"
+
+    def _example(self, schema, defs, digest, name):
+        """Erzeugt ein minimales, schemakonformes Beispiel für das JSON-Schema"""
+        if "$ref" in schema:
+            return self._example(defs[schema["$ref"].split("/")[-1]], defs, digest, name)
+        if "enum" in schema:
+            return schema["enum"][int(digest[:8], 16) % len(schema["enum"])]
+        schema_type = schema.get("type")
+        if schema_type == "object":
+            return {key: self._example(value, defs, digest, key) for key, value in schema.get("properties", {}).items()}
+        if schema_type == "array":
+            return [self._example(schema.get("items", {}), defs, digest, name)] * max(1, schema.get("minItems", 1))
+        if schema_type in ("integer", "number"):
+            return int(digest[:4], 16)
+        if schema_type == "boolean":
+            return int(digest[0], 16) % 2 == 0
+        return f"Stub {name} {digest[:16]}"
+
+    def invoke(self, prompt):
+        time.sleep(self.latency_seconds)
+        return self._respond(prompt)
+
+    def stream(self, prompt):
+        tokens = self._respond(prompt).split(" ")
+        for i, token in enumerate(tokens):
+            time.sleep(self.latency_seconds / len(tokens))
+            yield token if i == 0 else f" {token}"
+
+    async def ainvoke(self, prompt):
+        await asyncio.sleep(self.latency_seconds)
+        return self._respond(prompt)
+
+    async def astream(self, prompt):
+        tokens = self._respond(prompt).split(" ")
+        for i, token in enumerate(tokens):
+            await asyncio.sleep(self.latency_seconds / len(tokens))
+            yield token if i == 0 else f" {token}"
+
+
+def create_stub_llm(model, max_connections=8, **kwargs):
+    return StubLLM(model, **kwargs)
+
+
+LLM_BACKENDS = {
+    "ollama": create_ollama_llm,
+    "stub": create_stub_llm
+}
+
+
+def register_backend(name, factory):
+    """Registriert ein weiteres Backend; factory(model, max_connections, **kwargs) liefert das LLM"""
+    LLM_BACKENDS[name] = factory
+
+
+def create_llm(backend, model, max_connections=8, **kwargs):
+    """Erstellt ein LLM über das registrierte Backend"""
+    if backend not in LLM_BACKENDS:
+        raise ValueError(f"Unbekanntes LLM-Backend: {backend} (verfügbar: {', '.join(LLM_BACKENDS)})")
+    return LLM_BACKENDS[backend](model, max_connections=max_connections, **kwargs)
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def file_fingerprint(paths):
+    """SHA-256 über den Inhalt der angegebenen Dateien (fehlende Dateien zählen als leer)"""
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(path.encode('utf-8'))
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def llm_namespace(backend, model, options):
+    """Schlüsselpräfix aus Backend, Modell und Generierungsoptionen (z.B. temperature, format)"""
+    return json.dumps({"backend": backend, "model": model, "options": options}, sort_keys=True, ensure_ascii=False)
+
+
+class LLMResponseCache:
+    """
+    Persistenter Prompt→Antwort-Cache in SQLite für deterministische Aufrufe (temperature=0).
+    Schlüssel ist der Hash aus Namespace (Backend, Modell, Optionen) und Prompt, ein
+    Modellwechsel erzeugt damit automatisch neue Schlüssel. Ändert sich der Fingerprint
+    der Prompt-Vorlagen, wird der Cache beim Öffnen geleert. Bei mehr als max_entries
+    Einträgen werden die am längsten nicht genutzten verdrängt.
+    Asynchrone Aufrufer nutzen executor, damit SQLite nicht auf der Event-Loop läuft.
+    """
+    def __init__(self, db_path, max_entries=20000, fingerprint=""):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm-response-cache")
+        self.hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            row = self.connection.execute("SELECT value FROM meta WHERE name = 'fingerprint'").fetchone()
+            if row is None or row[0] != fingerprint:
+                if row is not None:
+                    print("Prompt-Vorlagen geändert, leere LLM-Antwort-Cache...")
+                self.connection.execute("DELETE FROM responses")
+                self.connection.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('fingerprint', ?)", (fingerprint,))
+
+    @staticmethod
+    def key(namespace, prompt):
+        return hashlib.sha256(f"{namespace}\n{prompt}".encode('utf-8')).hexdigest()
+
+    def get(self, namespace, prompt):
+        """Returns: gecachte Antwort oder None"""
+        key = self.key(namespace, prompt)
+        with self.lock, self.connection:
+            row = self.connection.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.connection.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, namespace, prompt, response):
+        key = self.key(namespace, prompt)
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created, last_used) VALUES (?, ?, ?, ?)",
+                (key, response, now, now)
+            )
+            count = self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.max_entries:
+                # Auf 90 % verkleinern, damit nicht jeder weitere Eintrag erneut verdrängt
+                excess = count - int(self.max_entries * 0.9)
+                self.connection.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                    (excess,)
+                )
+
+    def clear(self):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM responses")
+
+    def stats(self):
+        with self.lock:
+            size = self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                "size": size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0
+            }
+
+    def format_stats(self):
+        stats = self.stats()
+        return (
+            f"LLM-Antwort-Cache: {stats['size']} Einträge, "
+            f"Trefferquote {stats['hit_rate']:.1%} ({stats['hits']} Treffer, {stats['misses']} Fehlschläge)"
+        )
@@ -0,0 +1,279 @@
+import asyncio
+import heapq
+import itertools
+import threading
+from concurrent.futures import Future
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_LIVE = 1
+PRIORITY_BACKGROUND = 2
+
+DEFAULT_QUEUE_LIMITS = {
+    PRIORITY_INTERACTIVE: 64,
+    PRIORITY_LIVE: 64,
+    PRIORITY_BACKGROUND: 256
+}
+
+
+# Aufrufe des LLM, die Scheduler, Cache und Zusammenfassung identischer Prompts umgehen würden
+_UNSCHEDULED_CALLS = frozenset({
+    "batch", "abatch", "batch_as_completed", "abatch_as_completed",
+    "generate", "agenerate", "generate_prompt", "agenerate_prompt",
+    "predict", "apredict", "astream_events", "astream_log"
+})
+
+
+class LLMOverloadedError(RuntimeError):
+    """Wird ausgelöst, wenn die Warteschlange einer Prioritätsklasse voll ist (Load Shedding)"""
+
+
+class _Ticket:
+    """Warteplatz bzw. belegter Slot einer Anfrage beim PriorityScheduler"""
+    def __init__(self, priority, session_id, future=None, loop=None):
+        self.priority = priority
+        self.session_id = session_id
+        self.future = future
+        self.loop = loop
+        self.granted = False
+        self.cancelled = False
+
+
+class PriorityScheduler:
+    """
+    Vergibt die begrenzten LLM-Slots nach Prioritätsklassen (Chat vor Live-Quiz vor
+    Hintergrundarbeit). Innerhalb einer Klasse wird fair zwischen Sitzungen geteilt:
+    Anfragen einer Sitzung, die bereits viele Anfragen laufen oder wartend hat, werden
+    hinter die erste Anfrage anderer Sitzungen einsortiert. Ist die Warteschlange einer
+    Klasse voll, wird die Anfrage sofort abgewiesen.
+
+    Threads warten über eine Condition, Coroutinen über ein asyncio-Future ohne einen
+    Thread zu belegen. Wird eine wartende Coroutine abgebrochen (z.B. Tab geschlossen),
+    verlässt sie die Warteschlange bzw. gibt einen bereits zugeteilten Slot wieder frei.
+    """
+    def __init__(self, max_concurrency=4, queue_limits=None):
+        self.max_concurrency = max_concurrency
+        self.queue_limits = dict(DEFAULT_QUEUE_LIMITS)
+        self.queue_limits.update(queue_limits or {})
+        self.condition = threading.Condition()
+        self.active = 0
+        self.waiting = []
+        self.queue_depth = {priority: 0 for priority in self.queue_limits}
+        self.session_load = {}
+        self.sequence = itertools.count()
+
+    def _enqueue(self, ticket):
+        """Reiht ein Ticket ein und vergibt freie Slots (Lock muss gehalten werden)"""
+        if self.queue_depth.get(ticket.priority, 0) >= self.queue_limits.get(ticket.priority, 0):
+            raise LLMOverloadedError(f"LLM-Warteschlange für Priorität {ticket.priority} ist voll")
+
+        load = self.session_load.get(ticket.session_id, 0)
+        self.session_load[ticket.session_id] = load + 1
+        self.queue_depth[ticket.priority] += 1
+        heapq.heappush(self.waiting, (ticket.priority, load, next(self.sequence), ticket))
+        self._dispatch()
+
+    def _dispatch(self):
+        """Teilt freie Slots den vordersten Tickets zu (Lock muss gehalten werden)"""
+        while self.active < self.max_concurrency and self.waiting:
+            ticket = heapq.heappop(self.waiting)[-1]
+            if ticket.cancelled:
+                continue
+            ticket.granted = True
+            self.queue_depth[ticket.priority] -= 1
+            self.active += 1
+            if ticket.future is not None:
+                ticket.loop.call_soon_threadsafe(_resolve_future, ticket.future)
+        self.condition.notify_all()
+
+    def _drop_session_load(self, session_id):
+        remaining = self.session_load.get(session_id, 1) - 1
+        if remaining > 0:
+            self.session_load[session_id] = remaining
+        else:
+            self.session_load.pop(session_id, None)
+
+    def acquire(self, priority=PRIORITY_LIVE, session_id=None):
+        """Wartet auf einen Slot. Returns: Ticket, das an release übergeben wird"""
+        ticket = _Ticket(priority, session_id)
+        with self.condition:
+            self._enqueue(ticket)
+            while not ticket.granted:
+                self.condition.wait()
+        return ticket
+
+    async def acquire_async(self, priority=PRIORITY_LIVE, session_id=None):
+        """Wie acquire, wartet aber auf der Event-Loop statt in einem Thread"""
+        loop = asyncio.get_running_loop()
+        ticket = _Ticket(priority, session_id, loop.create_future(), loop)
+        with self.condition:
+            self._enqueue(ticket)
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            with self.condition:
+                if not ticket.granted:
+                    ticket.cancelled = True
+                    self.queue_depth[priority] -= 1
+                    self._drop_session_load(session_id)
+                    raise
+            self.release(ticket)
+            raise
+        return ticket
+
+    def release(self, ticket):
+        with self.condition:
+            self.active -= 1
+            self._drop_session_load(ticket.session_id)
+            self._dispatch()
+
+    def stats(self):
+        """Aktuell belegte Slots und Warteschlangenlängen pro Prioritätsklasse"""
+        with self.condition:
+            return {"active": self.active, "queue_depth": dict(self.queue_depth)}
+
+
+def _resolve_future(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class LLMClient:
+    """
+    Zugriffsschicht auf ein LLM mit synchronem invoke/stream und asynchronem ainvoke/astream.
+    Jede Anfrage wartet beim PriorityScheduler auf einen Slot. Identische Prompts, die
+    gleichzeitig angefragt werden, teilen sich eine Generierung (auch zwischen invoke und
+    ainvoke). Mit response_cache werden vollständige Antworten unter cache_namespace
+    persistent gespeichert; Treffer belegen keinen Slot. cacheable entscheidet optional, ob
+    eine Antwort gespeichert werden darf.
+    Echtes Batching mehrerer Prompts gibt es nicht, da Ollama keinen Endpunkt dafür hat;
+    gleichzeitige Anfragen verteilt der Scheduler auf die parallelen Slots von Ollama.
+    """
+    def __init__(self, llm, scheduler=None, response_cache=None, cache_namespace="", cacheable=None):
+        self.llm = llm
+        self.scheduler = scheduler or PriorityScheduler()
+        self.response_cache = response_cache
+        self.cache_namespace = cache_namespace
+        self.cacheable = cacheable
+        self.lock = threading.Lock()
+        self.inflight = {}
+
+    def __getattr__(self, name):
+        """Reicht Attribute des LLM durch, aber keine Aufrufe am Scheduler vorbei"""
+        if name in _UNSCHEDULED_CALLS:
+            raise AttributeError(f"LLMClient unterstützt {name} nicht, bitte invoke/ainvoke bzw. stream/astream nutzen")
+        return getattr(self.llm, name)
+
+    def _cached_response(self, prompt):
+        if self.response_cache is None:
+            return None
+        return self.response_cache.get(self.cache_namespace, prompt)
+
+    def _store_response(self, prompt, response):
+        if self.response_cache is None or (self.cacheable is not None and not self.cacheable(response)):
+            return
+        self.response_cache.put(self.cache_namespace, prompt, response)
+
+    async def _acached_response(self, prompt):
+        """Wie _cached_response, aber im Executor des Caches statt auf der Event-Loop"""
+        if self.response_cache is None:
+            return None
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.response_cache.executor, self._cached_response, prompt)
+
+    async def _astore_response(self, prompt, response):
+        if self.response_cache is None:
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.response_cache.executor, self._store_response, prompt, response)
+
+    def invoke(self, prompt, priority=PRIORITY_LIVE, session_id=None):
+        with self.lock:
+            future = self.inflight.get(prompt)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self.inflight[prompt] = future
+
+        if not is_owner:
+            return future.result()
+
+        try:
+            result = self._cached_response(prompt)
+            if result is None:
+                ticket = self.scheduler.acquire(priority, session_id)
+                try:
+                    result = self.llm.invoke(prompt)
+                finally:
+                    self.scheduler.release(ticket)
+                self._store_response(prompt, result)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.inflight.pop(prompt, None)
+
+    async def ainvoke(self, prompt, priority=PRIORITY_LIVE, session_id=None):
+        """Wie invoke, wartet aber auf der Event-Loop auf Slot und Generierung"""
+        with self.lock:
+            future = self.inflight.get(prompt)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self.inflight[prompt] = future
+
+        if not is_owner:
+            return await asyncio.wrap_future(future)
+
+        try:
+            result = await self._acached_response(prompt)
+            if result is None:
+                ticket = await self.scheduler.acquire_async(priority, session_id)
+                try:
+                    result = await self.llm.ainvoke(prompt)
+                finally:
+                    self.scheduler.release(ticket)
+                await self._astore_response(prompt, result)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            # auch bei Abbruch, damit wartende Aufrufer mit demselben Prompt nicht hängen bleiben
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.inflight.pop(prompt, None)
+
+    def stream(self, prompt, priority=PRIORITY_INTERACTIVE, session_id=None):
+        cached = self._cached_response(prompt)
+        if cached is not None:
+            yield cached
+            return
+
+        response = ""
+        ticket = self.scheduler.acquire(priority, session_id)
+        try:
+            for chunk in self.llm.stream(prompt):
+                response += chunk
+                yield chunk
+        finally:
+            self.scheduler.release(ticket)
+        self._store_response(prompt, response)
+
+    async def astream(self, prompt, priority=PRIORITY_INTERACTIVE, session_id=None):
+        cached = await self._acached_response(prompt)
+        if cached is not None:
+            yield cached
+            return
+
+        response = ""
+        ticket = await self.scheduler.acquire_async(priority, session_id)
+        try:
+            async for chunk in self.llm.astream(prompt):
+                response += chunk
+                yield chunk
+        finally:
+            self.scheduler.release(ticket)
+        await self._astore_response(prompt, response)
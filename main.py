@@ -4,37 +4,195 @@ MAIN_SCRIPT_PATH = "./BS2zsm.pdf"
 CACHE_DIR = "./cache"
 VECTORSTORE_PATH = os.path.join(CACHE_DIR, "chroma_db")
 METADATA_PATH = os.path.join(CACHE_DIR, "metadata.pkl")
+ZUSATZ_DIR = "./Zusatz"
+MANIFEST_PATH = os.path.join(CACHE_DIR, "ingestion_manifest.json")
+EMBEDDING_CACHE_DIR = os.path.join(CACHE_DIR, "embeddings")
+BM25_INDEX_PATH = os.path.join(CACHE_DIR, "bm25_index.pkl")
+ANSWER_RETRIEVAL_K = 4
+VECTOR_INDEX_MODE = "numpy"
+VECTOR_INDEX_STORAGE = "float32"
+VECTOR_INDEX_RERANK_PATH = os.path.join(CACHE_DIR, "vector_index.f32")
+VECTOR_INDEX_RERANK_FACTOR = 4
+VECTOR_INDEX_REPORT_K = 10
+RERANK_SCORER = "lexical"
+RERANK_CANDIDATES = 30
+RERANK_TOKEN_BUDGET = 1200
+QUEUE_CONCURRENCY = 8
+GENERATION_CONCURRENCY = 3
+GENERATION_REQUESTS = 2
+LLM_MAX_CONCURRENCY = 4
+LLM_BACKEND = "ollama"
+LLM_MODELS = {
+    "answer": "llama3.2",
+    "question": "llama3.2",
+    "topic": "llama3.2:1b",
+    "variation": "llama3.2:1b",
+    "validation": "llama3.2:1b"
+}
+LLM_BACKEND_OPTIONS = {"stub": {"latency_seconds": 1.0}}
+QUESTION_BANK_PATH = os.path.join(CACHE_DIR, "question_bank.json")
+QUESTION_BANK_LOW_WATER_MARK = 5
+QUESTION_BANK_TARGET_SIZE = 15
+QUESTION_SINGLE_PASS = True
+ANSWER_CACHE_SIZE = 256
+ANSWER_CACHE_TTL_SECONDS = 24 * 3600
+ANSWER_CACHE_SIMILARITY_THRESHOLD = 0.92
+LLM_RESPONSE_CACHE_PATH = os.path.join(CACHE_DIR, "llm_responses.sqlite")
+LLM_RESPONSE_CACHE_SIZE = 20000
+STARTUP_TARGET_SECONDS = 30
 
 os.makedirs(CACHE_DIR, exist_ok=True)
 
-from data_loader import load_pdfs, create_chunks, load_vectorstore, create_vectorstore
-from tutor import OptimizedBS2Tutor
-from gradio_interface import GradioInterface
+# Schwere Module (gradio, langchain, torch) werden erst in den Funktionen importiert: Die
+# Worker des PDF-Prozess-Pools (spawn) importieren main.py erneut und brauchen nur data_loader.
+from startup import StartupTimer
 
-def initialize_tutor():
+def initialize_tutor(timer=None):
     """Initialisiert den Tutor und gibt ihn zurück"""
-    if os.path.exists(VECTORSTORE_PATH) and os.path.exists(METADATA_PATH):
-        print("Lade existierenden Vektorspeicher...")
-        vectorstore, metadata = load_vectorstore(VECTORSTORE_PATH, METADATA_PATH)
-    else:
-        print("Erstelle neuen Vektorspeicher...")
-        documents = load_pdfs(MAIN_SCRIPT_PATH)
-        chunks = create_chunks(documents)
-        vectorstore, metadata = create_vectorstore(chunks, VECTORSTORE_PATH, METADATA_PATH)
-
-    tutor = OptimizedBS2Tutor(vectorstore)
+    from data_loader import iter_pdf_chunks, load_vectorstore, create_vectorstore, ingest_directory, load_lexical_index
+    from lexical_index import BM25Index
+    from vector_index import NumpyVectorStore
+    from reranker import Reranker, create_scorer
+    from tutor import OptimizedBS2Tutor
+    from answer_cache import AnswerCache
+    from llm_cache import LLMResponseCache, file_fingerprint
+    import prompts
+
+    timer = timer or StartupTimer()
+    with timer.phase("Vektorspeicher"):
+        if os.path.exists(VECTORSTORE_PATH) and os.path.exists(METADATA_PATH):
+            print("Lade existierenden Vektorspeicher...")
+            vectorstore, metadata = load_vectorstore(VECTORSTORE_PATH, METADATA_PATH, embedding_cache_dir=EMBEDDING_CACHE_DIR)
+            lexical_index = load_lexical_index(BM25_INDEX_PATH, vectorstore)
+        else:
+            print("Erstelle neuen Vektorspeicher...")
+            chunks = iter_pdf_chunks([MAIN_SCRIPT_PATH], "Hauptskript")
+            lexical_index = BM25Index()
+            vectorstore, metadata = create_vectorstore(
+                chunks,
+                VECTORSTORE_PATH,
+                METADATA_PATH,
+                embedding_cache_dir=EMBEDDING_CACHE_DIR,
+                lexical_index=lexical_index
+            )
+            if os.path.exists(MANIFEST_PATH):
+                os.remove(MANIFEST_PATH)
+
+    with timer.phase("Zusatz-Ingestion"):
+        ingest_directory(vectorstore, ZUSATZ_DIR, MANIFEST_PATH, "Zusatz", lexical_index=lexical_index)
+        if lexical_index.dirty:
+            lexical_index.save(BM25_INDEX_PATH)
+
+    if VECTOR_INDEX_MODE == "numpy":
+        with timer.phase("Vektorindex"):
+            vectorstore = NumpyVectorStore(
+                vectorstore,
+                storage=VECTOR_INDEX_STORAGE,
+                rerank_vectors_path=VECTOR_INDEX_RERANK_PATH,
+                rerank_factor=VECTOR_INDEX_RERANK_FACTOR,
+                report_k=VECTOR_INDEX_REPORT_K
+            )
+
+    with timer.phase("Tutor"):
+        answer_cache = AnswerCache(
+            vectorstore.embeddings,
+            max_size=ANSWER_CACHE_SIZE,
+            ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+            similarity_threshold=ANSWER_CACHE_SIMILARITY_THRESHOLD
+        )
+        tutor = OptimizedBS2Tutor(
+            vectorstore,
+            answer_cache=answer_cache,
+            llm_concurrency=LLM_MAX_CONCURRENCY,
+            llm_backend=LLM_BACKEND,
+            llm_models=LLM_MODELS,
+            backend_options=LLM_BACKEND_OPTIONS.get(LLM_BACKEND),
+            lexical_index=lexical_index,
+            retrieval_k=ANSWER_RETRIEVAL_K,
+            reranker=Reranker(
+                create_scorer(RERANK_SCORER),
+                token_budget=RERANK_TOKEN_BUDGET,
+                max_chunks=ANSWER_RETRIEVAL_K
+            ),
+            rerank_candidates=RERANK_CANDIDATES,
+            response_cache=LLMResponseCache(
+                LLM_RESPONSE_CACHE_PATH,
+                max_entries=LLM_RESPONSE_CACHE_SIZE,
+                fingerprint=file_fingerprint([prompts.__file__])
+            )
+        )
     return tutor, vectorstore
 
-def create_demo():
-    """Erstellt das Gradio-Interface"""
-    tutor, vectorstore = initialize_tutor()
-    interface = GradioInterface(tutor)
-    demo = interface.create_interface()
-    return demo, tutor, vectorstore
+def initialize_question_bank(tutor):
+    """Erstellt die Fragenbank und startet das Auffüllen im Hintergrund"""
+    from question_bank import QuestionBank
+    from question_generator import QuestionGenerator
+
+    question_bank = QuestionBank(
+        QuestionGenerator(tutor, single_pass=QUESTION_SINGLE_PASS),
+        QUESTION_BANK_PATH,
+        low_water_mark=QUESTION_BANK_LOW_WATER_MARK,
+        target_size=QUESTION_BANK_TARGET_SIZE
+    )
+    question_bank.start()
+    return question_bank
+
+def _report_background_startup(timer, future):
+    """Meldet das Ende des Hintergrundstarts, bei einem Fehler mit der Ursache"""
+    error = future.exception()
+    if error is not None:
+        print(f"[Start] Initialisierung des Tutors fehlgeschlagen: {error!r}")
+        return
+    timer.report("Tutor bereit")
+
+def create_demo(background_startup=False):
+    """
+    Erstellt das Gradio-Interface. Returns: (demo, tutor, vectorstore)
+    Mit background_startup werden Vektorspeicher und Embedding-Modell im Hintergrund
+    geladen, während die Oberfläche bereits startet; Anfragen warten auf das Future.
+    In diesem Modus ist tutor ein Future und vectorstore None, daher nutzt nur main()
+    den Hintergrundstart.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from gradio_interface import GradioInterface
+
+    timer = StartupTimer(STARTUP_TARGET_SECONDS)
+
+    if not background_startup:
+        tutor, vectorstore = initialize_tutor(timer)
+        question_bank = initialize_question_bank(tutor)
+        with timer.phase("Gradio-Interface"):
+            interface = GradioInterface(
+                tutor,
+                generation_concurrency=GENERATION_CONCURRENCY,
+                question_bank=question_bank,
+                generation_requests=GENERATION_REQUESTS
+            )
+            demo = interface.create_interface()
+        timer.report()
+        return demo, tutor, vectorstore
+
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tutor-init")
+    tutor_future = executor.submit(lambda: initialize_tutor(timer)[0])
+    question_bank_future = executor.submit(lambda: initialize_question_bank(tutor_future.result()))
+    question_bank_future.add_done_callback(lambda future: _report_background_startup(timer, future))
+    executor.shutdown(wait=False)
+
+    with timer.phase("Gradio-Interface"):
+        interface = GradioInterface(
+            tutor_future,
+            generation_concurrency=GENERATION_CONCURRENCY,
+            question_bank=question_bank_future,
+            generation_requests=GENERATION_REQUESTS
+        )
+        demo = interface.create_interface()
+    print(f"[Start] Oberfläche bereit nach {timer.elapsed():.2f}s")
+    return demo, tutor_future, None
 
 def main():
     """Hauptfunktion zum Starten der Anwendung"""
-    demo, _, _ = create_demo()
+    demo, _, _ = create_demo(background_startup=True)
+    demo.queue(default_concurrency_limit=QUEUE_CONCURRENCY)
     demo.launch(share=True)
 
 if __name__ == "__main__":
@@ -1,6 +1,75 @@
-def get_answer_prompt(language, question, documents):
+from utils import count_tokens, truncate_to_tokens
+
+ANSWER_CONTEXT_TOKEN_BUDGET = 1500
+CHUNK_CONTEXT_TOKEN_BUDGET = 700
+# Wie chunk_overlap in data_loader.get_text_splitter
+CHUNK_OVERLAP_CHARS = 59
+MIN_OVERLAP_CHARS = 20
+MIN_PARTIAL_CHUNK_TOKENS = 50
+
+
+def _overlap_length(previous, text):
+    """Länge des längsten Endes von previous, mit dem text beginnt (Chunk-Überlappung des Splitters)"""
+    for length in range(min(CHUNK_OVERLAP_CHARS, len(previous), len(text)), MIN_OVERLAP_CHARS - 1, -1):
+        if previous.endswith(text[:length]):
+            return length
+    return 0
+
+
+def _strip_overlap(doc, included):
+    """Entfernt Text, der bereits in aufgenommenen Nachbar-Chunks derselben Seite steht"""
+    text = doc.page_content
+    page_key = (doc.metadata.get('file_name'), doc.metadata.get('page'))
+    for other_key, other_text in included:
+        if other_key != page_key:
+            continue
+        head = _overlap_length(other_text, text)
+        tail = _overlap_length(text, other_text)
+        text = text[head:len(text) - tail] if head + tail < len(text) else ""
+    return text.strip()
+
+
+def build_context(language, documents, token_budget=ANSWER_CONTEXT_TOKEN_BUDGET):
     """
-    Erstellt einen Prompt für die Beantwortung von Fragen basierend auf der erkannten Sprache
+    Packt die Dokumente in Relevanzreihenfolge mit Quellenangabe, bis das Token-Budget
+    erreicht ist. Überlappungen benachbarter Chunks werden nur einmal aufgenommen; das
+    erste nicht mehr vollständig passende Dokument wird gekürzt, danach ist Schluss.
+    Returns: Liste von Textteilen für einen einzigen join
+    """
+    parts, included, used_tokens = [], [], 0
+    unknown = 'Unknown' if language == 'en' else 'Unbekannt'
+    for i, doc in enumerate(documents):
+        text = _strip_overlap(doc, included)
+        source_type = doc.metadata.get('source_type', unknown)
+        file_name = doc.metadata.get('file_name', unknown)
+        page = doc.metadata.get('page', unknown)
+        page_label = page + 1 if isinstance(page, int) else page
+
+        if language == 'de':
+            source = f"\n[{i+1}] Quelle: {source_type} ({file_name}, Seite {page_label})\n"
+        else:
+            source = f"\n[{i+1}] Source: {source_type} ({file_name}, Page {page_label})\n"
+
+        remaining = token_budget - used_tokens - count_tokens(source)
+        tokens = count_tokens(text)
+        if tokens > remaining:
+            if remaining < MIN_PARTIAL_CHUNK_TOKENS and parts:
+                break
+            text = truncate_to_tokens(text, max(remaining, 0))
+            tokens = count_tokens(text)
+
+        parts.extend((source, text, "\n"))
+        included.append(((doc.metadata.get('file_name'), doc.metadata.get('page')), doc.page_content))
+        used_tokens += count_tokens(source) + tokens
+        if used_tokens >= token_budget:
+            break
+    return parts
+
+
+def get_answer_prompt(language, question, documents, context_token_budget=ANSWER_CONTEXT_TOKEN_BUDGET):
+    """
+    Erstellt einen Prompt für die Beantwortung von Fragen basierend auf der erkannten Sprache.
+    Der Kontext wird in Relevanzreihenfolge bis context_token_budget Tokens aufgenommen.
     """
     if language == 'de':
         prompt = f"""
@@ -41,22 +110,11 @@ def get_answer_prompt(language, question, documents):
         AVAILABLE INFORMATION:
         """
 
-    for i, doc in enumerate(documents):
-        source_type = doc.metadata.get('source_type', 'Unknown' if language == 'en' else 'Unbekannt')
-        file_name = doc.metadata.get('file_name', 'Unknown' if language == 'en' else 'Unbekannt')
-        page = doc.metadata.get('page', 'Unknown' if language == 'en' else 'Unbekannt')
-
-        if language == 'de':
-            prompt += f"\n[{i+1}] Quelle: {source_type} ({file_name}, Seite {page+1})\n"
-        else:
-            prompt += f"\n[{i+1}] Source: {source_type} ({file_name}, Page {page+1})\n"
-
-        prompt += f"{doc.page_content}\n"
-
-    return prompt
+    return "".join([prompt, *build_context(language, documents, context_token_budget)])
 
 def get_question_prompt(language, topic, question_type, context):
     """Liefert den Prompt für die Fragengenerierung in der angegebenen Sprache"""
+    context = truncate_to_tokens(context, CHUNK_CONTEXT_TOKEN_BUDGET)
     if language == "de":
         if question_type == "mc":
             return f"""
@@ -180,8 +238,85 @@ def get_question_prompt(language, topic, question_type, context):
             }}
             """
 
+def get_single_pass_question_prompt(language, topic, question_type, context):
+    """Liefert den Prompt, der Frage, Antworten und Begründung in einer JSON-Antwort erzeugt"""
+    context = truncate_to_tokens(context, CHUNK_CONTEXT_TOKEN_BUDGET)
+    if language == "de":
+        if question_type == "mc":
+            answer_rule = "Mindestens 2 von 4 Antwortmöglichkeiten müssen korrekt sein"
+            example_answers = '["X", "Y"]'
+        else:
+            answer_rule = "Genau EINE Antwort darf korrekt sein"
+            example_answers = '["X"]'
+        return f"""
+            Erstelle eine präzise {"Multiple-Choice" if question_type == "mc" else "Single-Choice"}-Frage zum Thema: {topic}
+
+            WICHTIG:
+            1. Verwende NUR Informationen aus dem bereitgestellten Kontext
+            2. Die korrekten Antworten MÜSSEN direkt aus dem Kontext ableitbar sein
+            3. Erstelle genau 4 Antwortoptionen (A-D)
+            4. {answer_rule}
+            5. Falsche Antworten müssen plausibel sein
+            6. Verwende keine Optionen wie "Alle oben genannten" oder "Keine der genannten"
+            7. Die korrekte(n) Option(en) sollen nicht immer an derselben Stelle (A, B, C oder D) stehen
+            8. Überprüfe jede Antwortoption gegen den Kontext und begründe die korrekten Antworten mit Bezug auf den Kontext
+
+            KONTEXT:
+            {context}
+
+            Antworte ausschließlich mit JSON in diesem Format:
+            {{
+            "question": "Deine präzise Fachfrage hier",
+            "options": {{
+            "A": "Erste Option",
+            "B": "Zweite Option",
+            "C": "Dritte Option",
+            "D": "Vierte Option"
+            }},
+            "correct_answers": {example_answers},
+            "justification": "Kurze Begründung mit Bezug auf den Kontext"
+            }}
+            """
+    else:
+        if question_type == "mc":
+            answer_rule = "At least 2 out of 4 answers have to be correct"
+            example_answers = '["X", "Y"]'
+        else:
+            answer_rule = "Exactly ONE answer must be correct"
+            example_answers = '["X"]'
+        return f"""
+            Create a precise {"multiple-choice" if question_type == "mc" else "single-choice"} question about: {topic}
+
+            IMPORTANT:
+            1. Use ONLY information from the context provided
+            2. The correct answers MUST be directly derivable from the context
+            3. Create exactly 4 answer options (A-D)
+            4. {answer_rule}
+            5. Wrong answers must be plausible
+            6. Do not use options such as "All of the above" or "None of the above"
+            7. The correct option(s) should not always be in the same position (A, B, C or D)
+            8. Check each answer option against the context and justify the correct answers with reference to the context
+
+            CONTEXT:
+            {context}
+
+            Respond only with JSON in this format:
+            {{
+            "question": "Your precise technical question here",
+            "options": {{
+            "A": "First option",
+            "B": "Second option",
+            "C": "Third option",
+            "D": "Fourth option"
+            }},
+            "correct_answers": {example_answers},
+            "justification": "Brief justification with reference to the context"
+            }}
+            """
+
 def get_topic_extraction_prompt(language, content):
     """Liefert den Prompt zur Extraktion eines Themas aus einem Dokument"""
+    content = truncate_to_tokens(content, CHUNK_CONTEXT_TOKEN_BUDGET)
     if language == "de":
         return f"""
         Hier hast du alle relevanten Informationen von genau dieser Folie:{content}
@@ -201,6 +336,7 @@ def get_topic_extraction_prompt(language, content):
 
 def get_question_variation_prompt(language, topic, previous_questions_text, context):
     """Liefert den Prompt zur Generierung einer Variation einer Frage"""
+    context = truncate_to_tokens(context, CHUNK_CONTEXT_TOKEN_BUDGET)
     if language == "de":
         return f"""
         Du bist ein Experte für Business Software und Prüfungsvorbereitung.
@@ -261,6 +397,8 @@ def get_question_variation_prompt(language, topic, previous_questions_text, cont
         """
 
 def get_validation_prompt(language, doc_content, question, options, original_correct_answers):
+    """Liefert den Prompt zur Prüfung der korrekten Antworten gegen den Originaltext"""
+    doc_content = truncate_to_tokens(doc_content, CHUNK_CONTEXT_TOKEN_BUDGET)
     if language == "de":
         return f"""
         AUFGABE: Überprüfe die Korrektheit der Antworten für eine Multiple-Choice-Frage.
@@ -0,0 +1,152 @@
+import json
+import os
+import threading
+from chunk_sampler import CoverageTracker
+from dedup import QuestionDedupIndex
+from llm_client import PRIORITY_BACKGROUND
+from session_state import TrainerSession
+from utils import get_question_type_code
+
+QUESTION_TYPES = {
+    "mc": "Multiple Choice (MC)",
+    "sc": "Single Choice (SC)"
+}
+LANGUAGES = ["de", "en"]
+
+
+class QuestionBank:
+    """
+    Persistenter Vorrat an vorab generierten und validierten Fragen pro Sprache und Fragetyp.
+    Ein Hintergrund-Thread füllt den Vorrat auf, sobald er unter die Low-Water-Mark fällt.
+    """
+    def __init__(self, question_generator, bank_path, low_water_mark=5, target_size=15):
+        self.question_generator = question_generator
+        self.bank_path = bank_path
+        self.low_water_mark = low_water_mark
+        self.target_size = max(target_size, low_water_mark)
+        self.questions = {self._key(language, q_type): [] for language in LANGUAGES for q_type in QUESTION_TYPES}
+        self.lock = threading.Lock()
+        self.refill_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.worker = None
+        self.coverage = CoverageTracker()
+        self.dedup_index = question_generator.dedup_index
+        if self.dedup_index is None:
+            self.dedup_index = question_generator.dedup_index = QuestionDedupIndex()
+        self._load()
+
+    @staticmethod
+    def _key(language, q_type_code):
+        return f"{language}_{q_type_code}"
+
+    def _load(self):
+        """Lädt den Fragenvorrat von der Festplatte"""
+        if not os.path.exists(self.bank_path):
+            return
+        try:
+            with open(self.bank_path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+            for key, questions in stored.items():
+                if key in self.questions:
+                    self.questions[key] = questions
+                    for question_data in questions:
+                        self.dedup_index.add(question_data["question_text"], question_data["question_text"])
+            print(f"Fragenbank geladen: {self.size()} Fragen")
+        except Exception as e:
+            print(f"Fehler beim Laden der Fragenbank: {e}")
+
+    def _save(self):
+        """Speichert den Fragenvorrat atomar auf der Festplatte (Lock muss gehalten werden)"""
+        tmp_path = f"{self.bank_path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.questions, f, ensure_ascii=False)
+            os.replace(tmp_path, self.bank_path)
+        except Exception as e:
+            print(f"Fehler beim Speichern der Fragenbank: {e}")
+
+    def size(self, language=None, q_type_code=None):
+        """Anzahl der gespeicherten Fragen, optional gefiltert nach Sprache und Fragetyp"""
+        with self.lock:
+            if language and q_type_code:
+                return len(self.questions[self._key(language, q_type_code)])
+            return sum(len(questions) for questions in self.questions.values())
+
+    def take(self, language, question_type, count, accept=None):
+        """
+        Entnimmt bis zu count Fragen aus dem Vorrat und stößt bei Bedarf das Auffüllen an.
+        accept: optionale Prüfung pro Frage (z.B. gegen den Verlauf der Sitzung);
+        abgelehnte Fragen bleiben für andere Sitzungen im Vorrat.
+        """
+        key = self._key(language, get_question_type_code(question_type))
+        with self.lock:
+            taken, kept = [], []
+            for question_data in self.questions.get(key, []):
+                if len(taken) < int(count) and (accept is None or accept(question_data)):
+                    taken.append(question_data)
+                else:
+                    kept.append(question_data)
+            self.questions[key] = kept
+            if taken:
+                self._save()
+            remaining = len(kept)
+
+        if remaining < self.low_water_mark:
+            self.refill_event.set()
+        return taken
+
+    def add(self, language, q_type_code, question_data):
+        """Fügt eine Frage hinzu, sofern sie sich ausreichend von allen bekannten Fragen unterscheidet"""
+        key = self._key(language, q_type_code)
+        question_text = question_data["question_text"]
+        with self.lock:
+            if self.dedup_index.find_duplicate(question_text):
+                return False
+            self.dedup_index.add(question_text, question_text)
+            self.questions[key].append(question_data)
+            self._save()
+        return True
+
+    def start(self):
+        """Startet den Hintergrund-Thread zum Auffüllen der Fragenbank"""
+        if self.worker is not None and self.worker.is_alive():
+            return
+        self.stop_event.clear()
+        self.worker = threading.Thread(target=self._run, name="question-bank-refill", daemon=True)
+        self.worker.start()
+        self.refill_event.set()
+
+    def stop(self):
+        """Beendet den Hintergrund-Thread nach der aktuellen Generierung"""
+        self.stop_event.set()
+        self.refill_event.set()
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            self.refill_event.wait(timeout=60)
+            self.refill_event.clear()
+            for language in LANGUAGES:
+                for q_type_code in QUESTION_TYPES:
+                    if self.size(language, q_type_code) < self.low_water_mark:
+                        self._refill(language, q_type_code)
+
+    def _refill(self, language, q_type_code):
+        """Generiert Fragen, bis der Zielbestand erreicht ist"""
+        print(f"Fülle Fragenbank auf ({language}, {q_type_code})...")
+        session = TrainerSession(language)
+        session.coverage = self.coverage
+        session.llm_priority = PRIORITY_BACKGROUND
+        question_type = QUESTION_TYPES[q_type_code]
+        failures = 0
+        while self.size(language, q_type_code) < self.target_size and failures < self.target_size:
+            if self.stop_event.is_set():
+                return
+            try:
+                question_data = self.question_generator.generate_random_question_internal(session, question_type)
+                if question_data.get("options") and len(question_data["options"]) >= 2:
+                    if self.add(language, q_type_code, question_data):
+                        continue
+            except Exception as e:
+                print(f"Fehler beim Auffüllen der Fragenbank: {e}")
+            failures += 1
+        print(f"Fragenbank ({language}, {q_type_code}): {self.size(language, q_type_code)} Fragen")
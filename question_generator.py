@@ -2,21 +2,42 @@ import random
 import json
 import re
 from utils import get_relevant_documents
+from schemas import (
+    GeneratedQuestion,
+    SinglePassQuestion,
+    ValidationResult,
+    parse_structured_response,
+    validate_structured_data
+)
 from language_utils import get_error_message
+from llm_client import LLMOverloadedError
 from prompts import (
     get_question_prompt,
+    get_single_pass_question_prompt,
     get_topic_extraction_prompt,
     get_validation_prompt,
     get_question_variation_prompt
 )
 
-class QuestionGenerator:
-    def __init__(self, interface):
-        self.interface = interface
-        self.tutor = interface.tutor
+SOURCE_EXCERPT_LENGTH = 500
 
-    def generate_question_with_language(self, topic, question_type, previous_questions=None):
-        """Generiert eine Frage in der ausgewählten Sprache"""
+class QuestionGenerator:
+    def __init__(self, tutor, dedup_index=None, single_pass=False):
+        """
+        dedup_index: gemeinsamer Index aller Fragen der Fragenbank (optional)
+        single_pass: Frage, Antworten und Begründung in einem JSON-Aufruf erzeugen
+        """
+        self.tutor = tutor
+        self.dedup_index = dedup_index
+        self.single_pass = single_pass
+
+    @staticmethod
+    def _invoke(session, llm, prompt):
+        """LLM-Aufruf mit der Priorität der Sitzung (Live-Quiz oder Hintergrund-Auffüllung)"""
+        return llm.invoke(prompt, priority=session.llm_priority, session_id=id(session))
+
+    def generate_question_with_language(self, session, topic, question_type, previous_questions=None):
+        """Generiert eine Frage in der Sprache der Sitzung"""
 
         if previous_questions is None:
             previous_questions = []
@@ -26,93 +47,154 @@ class QuestionGenerator:
                 self.tutor.vectorstore,
                 topic,
                 k=5,
-                filter_type="Hauptskript"
+                filter_type="Hauptskript",
+                lexical_index=self.tutor.lexical_index
             )
 
             if not docs:
-                error_msg = get_error_message(self.interface.question_language, "no_documents")
+                error_msg = get_error_message(session.question_language, "no_documents")
                 return {"error": error_msg}
 
             doc = random.choice(docs[:3]) if len(docs) >= 3 else docs[0]
 
-            prompt = get_question_prompt(
-                self.interface.question_language,
-                topic,
-                question_type,
-                doc.page_content
-            )
-
-            response = self.tutor.llm.invoke(prompt)
-            question_data = self._parse_question_response(response, doc)
+            question_data = self._generate_from_doc(session, topic, question_type, doc)
             max_attempts = 3
             attempts = 0
 
-            while attempts < max_attempts and not self.is_question_unique(question_data, previous_questions):
+            while attempts < max_attempts and (question_data.get("duplicate") or not self.is_question_unique(session, question_data)):
                 if len(docs) > 1:
                     doc = random.choice([d for d in docs if d != doc])
 
-                prompt = get_question_prompt(
-                    self.interface.question_language,
-                    topic,
-                    question_type,
-                    doc.page_content
-                )
-
-                response = self.tutor.llm.invoke(prompt)
-                question_data = self._parse_question_response(response, doc)
+                question_data = self._generate_from_doc(session, topic, question_type, doc)
                 attempts += 1
 
             return question_data
 
+        except LLMOverloadedError:
+            return {"error": get_error_message(session.question_language, "overloaded"), "overloaded": True}
         except Exception as e:
-            error_msg = get_error_message(self.interface.question_language, "question_generation")
+            error_msg = get_error_message(session.question_language, "question_generation")
             return {"error": f"{error_msg}: {str(e)}"}
 
-    def _parse_question_response(self, response, doc):
-        """Parst die LLM-Antwort und extrahiert die Fragedaten mit Validierung"""
-        json_match = re.search(r'\{.*\}', response, re.DOTALL)
-        if not json_match:
-            error_msg = get_error_message(self.interface.question_language, "invalid_question")
+    def _generate_from_doc(self, session, topic, question_type, doc):
+        """Erzeugt eine Frage zu einem Chunk, je nach Modus mit einem oder zwei LLM-Aufrufen"""
+        if self.single_pass:
+            prompt = get_single_pass_question_prompt(
+                session.question_language,
+                topic,
+                question_type,
+                doc.page_content
+            )
+            response = self._invoke(session, self.tutor.single_pass_llm, prompt)
+            return self._parse_single_pass_response(session, response, doc, question_type)
+
+        prompt = get_question_prompt(
+            session.question_language,
+            topic,
+            question_type,
+            doc.page_content
+        )
+        response = self._invoke(session, self.tutor.question_llm, prompt)
+        return self._parse_question_response(session, response, doc)
+
+    def _parse_question_response(self, session, response, doc):
+        """
+        Parst die schema-gebundene LLM-Antwort und validiert die korrekten Antworten.
+        Die JSON-Extraktion per Regex greift nur noch bei Backends ohne Schema-Unterstützung.
+        """
+        question_data = parse_structured_response(GeneratedQuestion, response)
+        if question_data is None:
+            extracted = self._extract_json_from_response(response)
+            question_data = validate_structured_data(GeneratedQuestion, extracted) if extracted else None
+
+        if question_data is None:
+            error_msg = get_error_message(session.question_language, "invalid_question")
+            return {"error": error_msg}
+
+        return self._build_question_record(session, question_data, doc, validate=True)
+
+    def _parse_single_pass_response(self, session, response, doc, question_type):
+        """
+        Parst die JSON-Antwort des Single-Pass-Modus. Die separate Validierung läuft
+        nur, wenn die Selbstkonsistenzprüfung fehlschlägt.
+        """
+        question_data = parse_structured_response(SinglePassQuestion, response)
+        if question_data is None:
+            error_msg = get_error_message(session.question_language, "json_parse")
             return {"error": error_msg}
 
         try:
-            json_str = json_match.group(0)
-            question_data = json.loads(json_str)
-            validated_data = self._validate_correct_answers(question_data, doc)
-
-            self.tutor.last_correct_answers = validated_data["correct_answers"]
-
-            return {
-                "question_text": validated_data["question"],
-                "options": validated_data["options"],
-                "source": {
-                    "type": doc.metadata.get('source_type', 'Unknown' if self.interface.question_language == "en" else "Unbekannt"),
-                    "file": doc.metadata.get('file_name', 'Unknown' if self.interface.question_language == "en" else "Unbekannt"),
-                    "page": doc.metadata.get('page', 'Unknown' if self.interface.question_language == "en" else "Unbekannt")
-                }
-            }
-        except json.JSONDecodeError:
-            error_msg = get_error_message(self.interface.question_language, "json_parse")
+            consistent = self._is_self_consistent(question_data, question_type, doc)
+            if not consistent:
+                print("Selbstkonsistenzprüfung fehlgeschlagen, validiere separat")
+            return self._build_question_record(session, question_data, doc, validate=not consistent)
+        except (KeyError, TypeError, AttributeError):
+            error_msg = get_error_message(session.question_language, "invalid_question")
             return {"error": error_msg}
 
-    def generate_random_question_internal(self, question_type):
+    def _is_self_consistent(self, question_data, question_type, doc):
+        """Günstige Plausibilitätsprüfung einer Single-Pass-Antwort ohne weiteren LLM-Aufruf"""
+        options = question_data.get("options")
+        correct_answers = question_data.get("correct_answers")
+        if not isinstance(options, dict) or set(options) != set("ABCD"):
+            return False
+        if not all(isinstance(text, str) and text.strip() for text in options.values()):
+            return False
+        if not isinstance(correct_answers, list) or not correct_answers or not set(correct_answers) <= set("ABCD"):
+            return False
+        if question_type == "sc" and len(correct_answers) != 1:
+            return False
+        if question_type == "mc" and len(correct_answers) < 2:
+            return False
+        if not str(question_data.get("justification", "")).strip():
+            return False
+
+        context_words = set(re.findall(r'\w{4,}', doc.page_content.lower()))
+        for answer in correct_answers:
+            option_words = set(re.findall(r'\w{4,}', options[answer].lower()))
+            if option_words and not option_words & context_words:
+                return False
+        return True
+
+    def _build_question_record(self, session, question_data, doc, validate=True):
+        """Prüft auf Duplikate, validiert optional und baut den Fragen-Datensatz"""
+        if self.is_known_question(session, question_data.get("question", "")):
+            error_msg = get_error_message(session.question_language, "duplicate_question")
+            return {"error": error_msg, "duplicate": True}
+
+        validated_data = self._validate_correct_answers(session, question_data, doc) if validate else question_data
+
+        return {
+            "question_text": validated_data["question"],
+            "options": validated_data["options"],
+            "correct_answers": validated_data["correct_answers"],
+            "source": {
+                "type": doc.metadata.get('source_type', 'Unknown' if session.question_language == "en" else "Unbekannt"),
+                "file": doc.metadata.get('file_name', 'Unknown' if session.question_language == "en" else "Unbekannt"),
+                "page": doc.metadata.get('page', 'Unknown' if session.question_language == "en" else "Unbekannt"),
+                "chunk_id": doc.metadata.get('chunk_id'),
+                "excerpt": doc.page_content[:SOURCE_EXCERPT_LENGTH]
+            }
+        }
+
+    def generate_random_question_internal(self, session, question_type):
         """Generiert eine Frage mit einem zufällig aus dem Vektorspeicher extrahierten Thema"""
         q_type_code = "mc" if "Multiple" in question_type else "sc"
 
         try:
-            random_docs = self.get_random_documents(5)
+            random_docs = self.get_random_documents(1, session.coverage)
 
             if not random_docs:
-                error_msg = get_error_message(self.interface.question_language, "no_vectorstore_docs")
+                error_msg = get_error_message(session.question_language, "no_vectorstore_docs")
                 return {"question_text": error_msg, "options": {}}
 
-            random_doc = random.choice(random_docs)
+            random_doc = random_docs[0]
             topic_prompt = get_topic_extraction_prompt(
-                self.interface.question_language,
+                session.question_language,
                 random_doc.page_content
             )
 
-            topic = self.tutor.llm.invoke(topic_prompt).strip()
+            topic = self._invoke(session, self.tutor.topic_llm, topic_prompt).strip()
 
             topic = topic.replace('"', '').replace("'", "").strip()
             if topic.lower().startswith("thema:"):
@@ -122,32 +204,17 @@ class QuestionGenerator:
 
             print(f"Extrahiertes Thema: {topic}")
 
-            prompt = get_question_prompt(
-                self.interface.question_language,
-                topic,
-                q_type_code,
-                random_doc.page_content
-            )
-
-            response = self.tutor.llm.invoke(prompt)
-            question_data = self._parse_question_response(response, random_doc)
+            question_data = self._generate_from_doc(session, topic, q_type_code, random_doc)
 
             if "error" in question_data:
                 return {"question_text": question_data["error"], "options": {}}
 
-            self.interface.current_question["options"] = question_data["options"]
-            self.interface.current_question["correct_answers"] = self.tutor.last_correct_answers
-            self.interface.current_question["question_type"] = q_type_code
-            
-            question_text = question_data['question_text']
-
-            return {
-                "question_text": question_text,
-                "options": question_data["options"],
-                "question_type": question_type
-            }
+            question_data["question_type"] = question_type
+            return question_data
+        except LLMOverloadedError:
+            return {"error": get_error_message(session.question_language, "overloaded"), "overloaded": True}
         except Exception as e:
-            error_msg = get_error_message(self.interface.question_language, "question_generation")
+            error_msg = get_error_message(session.question_language, "question_generation")
             return {"question_text": f"{error_msg}: {str(e)}", "options": {}}
 
     def _extract_json_from_response(self, response):
@@ -185,21 +252,23 @@ class QuestionGenerator:
             pass
         return None
 
-    def _validate_correct_answers(self, question_data, doc):
+    def _validate_correct_answers(self, session, question_data, doc):
         """Validiert die korrekten Antworten gegen den Originaltext mit verbesserter Robustheit"""
         question = question_data["question"]
         options = question_data["options"]
         original_correct_answers = question_data["correct_answers"]
         validation_prompt = get_validation_prompt(
-            self.interface.question_language,
+            session.question_language,
             doc.page_content,
             question,
             options,
             original_correct_answers
         )
 
-        validation_response = self.tutor.llm.invoke(validation_prompt)
-        validation_data = self._extract_json_from_response(validation_response)
+        validation_response = self._invoke(session, self.tutor.validation_llm, validation_prompt)
+        validation_data = parse_structured_response(ValidationResult, validation_response)
+        if validation_data is None:
+            validation_data = self._extract_json_from_response(validation_response)
 
         if not validation_data:
             print("Validierung fehlgeschlagen: Konnte kein gültiges JSON extrahieren")
@@ -226,74 +295,58 @@ class QuestionGenerator:
             print(f"Fehler bei der Validierung: {e}")
             return question_data
 
-    def get_random_documents(self, count):
-        """Holt wirklich zufällige Dokumente aus dem Vektorspeicher ohne vordefinierte Themen"""
+    def get_random_documents(self, count, coverage=None):
+        """
+        Zieht zufällige Dokumente aus dem gesamten Hauptskript.
+        Mit einem CoverageTracker werden bereits verwendete Chunks nicht erneut gezogen
+        und wenig abgedeckte Seiten bevorzugt.
+        """
         try:
-            try:
-                all_docs = list(self.tutor.vectorstore._collection.get(
-                    where={"source_type": "Hauptskript"},
-                    limit=150
-                ))
-                if len(all_docs) >= 10:
-                    print(f"Methode 1: {len(all_docs)} Dokumente gefunden")
-                    return random.sample(all_docs, min(count, len(all_docs)))
-            except Exception as collection_error:
-                print(f"Methode 1 fehlgeschlagen: {collection_error}")
-                pass
-
-            all_docs = self.tutor.vectorstore.similarity_search(
-                "",
-                k=150,
-                filter={"source_type": "Hauptskript"}
-            )
-            print(f"Fallback-Methode: {len(all_docs)} Dokumente gefunden")
-
-            if len(all_docs) < 10:
-                all_docs = self.tutor.vectorstore.similarity_search(
-                    "",
-                    k=150
-                )
-                print(f"Fallback ohne Filter: {len(all_docs)} Dokumente gefunden")
-
-            if len(all_docs) <= count:
-                return all_docs
-            return random.sample(all_docs, count)
+            docs = self.tutor.chunk_index.sample_documents(count, source_type="Hauptskript", coverage=coverage)
+            if not docs:
+                print("Keine Hauptskript-Chunks im Index, ziehe aus allen Dokumenten")
+                docs = self.tutor.chunk_index.sample_documents(count, coverage=coverage)
+            return docs
         except Exception as e:
             print(f"Fehler beim Abrufen zufälliger Dokumente: {e}")
             return []
 
-    def is_question_unique(self, new_question, previous_questions, threshold=0.7):
-        """Überprüft, ob eine Frage ausreichend einzigartig ist im Vergleich zu vorherigen Fragen"""
-        if not previous_questions:
-            return True
-
-        from difflib import SequenceMatcher
-
-        if "question_text" in new_question and "\n\n" in new_question["question_text"]:
-            new_question_text = new_question["question_text"].split("\n\n", 1)[1]
-        else:
-            new_question_text = new_question.get("question_text", "")
-
-        for prev_q in previous_questions:
-            prev_text = prev_q.get("question_text", "")
-            if "\n\n" in prev_text:
-                prev_text = prev_text.split("\n\n", 1)[1]
-
-            similarity = SequenceMatcher(None, new_question_text, prev_text).ratio()
-            if similarity > threshold:
-                print(f"Frage zu ähnlich (Ähnlichkeit: {similarity:.2f})")
-                return False
-
+    def is_question_unique(self, session, new_question):
+        """
+        Überprüft, ob eine Frage ausreichend einzigartig ist im Vergleich zu den Fragen der Sitzung.
+        Nutzt den Index session.seen_questions, in den add_to_queue jede Frage einträgt.
+        """
+        match = session.seen_questions.find_duplicate(new_question.get("question_text", ""))
+        if match:
+            print(f"Frage zu ähnlich (Ähnlichkeit: {match[1]:.2f})")
+            return False
         return True
 
-    def generate_question_variation(self, topic, question_type, previous_questions):
+    def is_known_question(self, session, question_text):
+        """
+        Prüft eine Frage gegen den Verlauf der Sitzung und die gesamte Fragenbank,
+        bevor für Validierung weitere LLM-Aufrufe anfallen
+        """
+        if not question_text:
+            return False
+        for index in (getattr(session, "seen_questions", None), self.dedup_index):
+            if index is None:
+                continue
+            match = index.find_duplicate(question_text)
+            if match:
+                print(f"Bereits bekannte Frage verworfen (Ähnlichkeit: {match[1]:.2f})")
+                return True
+        return False
+
+    def generate_question_variation(self, session, topic, question_type, previous_questions):
         """Generiert eine Variation einer Frage zu einem bestimmten Thema"""
         try:
             docs = get_relevant_documents(
                 self.tutor.vectorstore,
                 topic,
                 k=5,
-                filter_type="Hauptskript"
+                filter_type="Hauptskript",
+                lexical_index=self.tutor.lexical_index
             )
 
             if docs:
@@ -305,15 +358,18 @@ class QuestionGenerator:
             previous_questions_text = "\n".join([f"- {q['question_text']}" for q in previous_questions])
 
             variation_prompt = get_question_variation_prompt(
-                self.interface.question_language,
+                session.question_language,
                 topic,
                 previous_questions_text,
                 context
             )
 
-            subtopic = self.tutor.llm.invoke(variation_prompt).strip()
+            subtopic = self._invoke(session, self.tutor.variation_llm, variation_prompt).strip()
             subtopic = subtopic.replace('"', '').replace("'", "").strip()
             return f"{topic} - {subtopic}"
+        except LLMOverloadedError:
+            # Keine Ersatz-Variation: der folgende Generierungsaufruf würde ebenfalls abgewiesen
+            raise
         except Exception as e:
             print(f"Fehler bei der Unterthema-Generierung: {e}")
             return f"{topic} (Variation {len(previous_questions) + 1})"
\ No newline at end of file
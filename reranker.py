@@ -0,0 +1,99 @@
+import math
+from lexical_index import tokenize
+from utils import count_tokens
+
+
+class LexicalOverlapScorer:
+    """
+    Günstiger Scorer ohne Modell: Anteil der Suchbegriffe, die im Chunk vorkommen,
+    gewichtet mit der IDF innerhalb der Kandidatenmenge. Füllwörter, die in fast
+    allen Kandidaten stehen, tragen so kaum zum Score bei.
+    """
+    def score(self, query, documents):
+        query_terms = set(tokenize(query))
+        document_terms = [set(tokenize(doc.page_content)) for doc in documents]
+        if not query_terms or not documents:
+            return [0.0] * len(documents)
+
+        idf = {}
+        for term in query_terms:
+            document_frequency = sum(1 for terms in document_terms if term in terms)
+            idf[term] = math.log(1 + len(documents) / (1 + document_frequency))
+        total = sum(idf.values())
+        return [sum(idf[term] for term in query_terms & terms) / total for terms in document_terms]
+
+
+class CrossEncoderScorer:
+    """Scorer mit lokalem Cross-Encoder; alle Kandidaten laufen in einem Batch durch das Modell"""
+    def __init__(self, model_name="BAAI/bge-reranker-v2-m3"):
+        import torch
+        from sentence_transformers import CrossEncoder
+
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        self.model = CrossEncoder(model_name, device=device)
+
+    def score(self, query, documents):
+        if not documents:
+            return []
+        pairs = [(query, doc.page_content) for doc in documents]
+        return [float(score) for score in self.model.predict(pairs, batch_size=len(pairs))]
+
+
+def create_scorer(kind="lexical", model_name=None):
+    """Erstellt den Scorer; fehlt sentence-transformers, wird auf den lexikalischen Scorer ausgewichen"""
+    if kind == "cross-encoder":
+        try:
+            return CrossEncoderScorer(model_name) if model_name else CrossEncoderScorer()
+        except ImportError as e:
+            print(f"Cross-Encoder nicht verfügbar ({e}), nutze lexikalischen Scorer")
+    return LexicalOverlapScorer()
+
+
+class Reranker:
+    """
+    Bewertet eine breite Kandidatenmenge neu und behält höchstens max_chunks der besten
+    Chunks, soweit sie in das Token-Budget des Antwort-Prompts passen (mindestens min_chunks).
+    Der Score des Scorers wird auf 0..1 normiert und mit dem Rang aus der Fusion gemischt
+    (rank_weight), damit gute Treffer des Retrievals nicht allein am Scorer scheitern.
+    Kandidaten mit Score <= min_score werden verworfen; None schaltet den Filter ab.
+    """
+    def __init__(self, scorer=None, token_budget=1200, min_chunks=1, max_chunks=None, min_score=0.0, rank_weight=0.3):
+        self.scorer = scorer or LexicalOverlapScorer()
+        self.token_budget = token_budget
+        self.min_chunks = min_chunks
+        self.max_chunks = max_chunks
+        self.min_score = min_score
+        self.rank_weight = rank_weight
+
+    def combined_scores(self, scores):
+        """Mischt normierten Scorer-Score und Fusionsrang (1.0 für den ersten Kandidaten)"""
+        if not scores:
+            return []
+        low, high = min(scores), max(scores)
+        count = len(scores)
+        combined = []
+        for i, score in enumerate(scores):
+            normalized = (score - low) / (high - low) if high > low else 1.0
+            rank_score = 1.0 - i / count
+            combined.append((1 - self.rank_weight) * normalized + self.rank_weight * rank_score)
+        return combined
+
+    def rerank(self, query, documents, max_chunks=None):
+        """max_chunks überschreibt für diesen Aufruf die Obergrenze des Rerankers"""
+        max_chunks = max_chunks if max_chunks is not None else self.max_chunks
+        scores = self.scorer.score(query, documents)
+        combined = self.combined_scores(scores)
+        ranked = sorted(range(len(documents)), key=lambda i: (-combined[i], i))
+
+        selected, used_tokens = [], 0
+        for i in ranked:
+            if max_chunks is not None and len(selected) >= max_chunks:
+                break
+            if self.min_score is not None and scores[i] <= self.min_score and len(selected) >= self.min_chunks:
+                continue
+            tokens = count_tokens(documents[i].page_content)
+            if used_tokens + tokens > self.token_budget and len(selected) >= self.min_chunks:
+                continue
+            selected.append(documents[i])
+            used_tokens += tokens
+        return selected
@@ -0,0 +1,66 @@
+from langchain_core.documents import Document
+
+RRF_K = 60
+
+
+def document_key(document):
+    """
+    Schlüssel eines Chunks für die Fusion: chunk_id (entspricht der Chroma-ID, mit der auch
+    der BM25-Index arbeitet), ersatzweise der Text
+    """
+    return document.metadata.get('chunk_id') or document.page_content
+
+
+def reciprocal_rank_fusion(rankings, rrf_k=RRF_K):
+    """
+    Fusioniert mehrere Rangfolgen von Schlüsseln per Reciprocal Rank Fusion.
+    Returns: Schlüssel absteigend nach fusioniertem Score
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def fetch_documents(vectorstore, chunk_ids):
+    """Lädt Chunks per ID aus der Collection, in der übergebenen Reihenfolge"""
+    if not chunk_ids:
+        return []
+    result = vectorstore._collection.get(ids=list(chunk_ids), include=["documents", "metadatas"])
+    by_id = {}
+    for chunk_id, text, metadata in zip(result["ids"], result["documents"], result["metadatas"]):
+        metadata = dict(metadata or {})
+        metadata['chunk_id'] = chunk_id
+        by_id[chunk_id] = Document(page_content=text, metadata=metadata)
+    return [by_id[chunk_id] for chunk_id in chunk_ids if chunk_id in by_id]
+
+
+def dense_search(vectorstore, query, k, source_type=None, query_embedding=None):
+    """Dichte Suche über den Vektorspeicher, mit vorberechnetem Embedding falls vorhanden"""
+    filter_dict = {"source_type": source_type} if source_type else None
+    if query_embedding is not None:
+        return vectorstore.similarity_search_by_vector(list(query_embedding), k=k, filter=filter_dict)
+    return vectorstore.similarity_search(query, k=k, filter=filter_dict)
+
+
+def hybrid_search(vectorstore, lexical_index, query, k, source_type=None, query_embedding=None, candidate_k=None, rrf_k=RRF_K):
+    """
+    Kombiniert dichte Suche und BM25 per Reciprocal Rank Fusion.
+    Beide Verfahren liefern je candidate_k Kandidaten; nur rein lexikalische Treffer,
+    die es in die Top-k schaffen, werden anschließend aus der Collection geladen.
+    """
+    if lexical_index is None:
+        return dense_search(vectorstore, query, k, source_type, query_embedding)
+
+    candidate_k = candidate_k or 2 * k
+    dense_docs = dense_search(vectorstore, query, candidate_k, source_type, query_embedding)
+
+    lexical_ids = [chunk_id for chunk_id, _ in lexical_index.search(query, candidate_k, source_type)]
+    docs_by_key = {document_key(doc): doc for doc in dense_docs}
+    fused = reciprocal_rank_fusion([[document_key(doc) for doc in dense_docs], lexical_ids], rrf_k)[:k]
+
+    missing = [key for key in fused if key not in docs_by_key]
+    for doc in fetch_documents(vectorstore, missing):
+        docs_by_key[document_key(doc)] = doc
+    return [docs_by_key[key] for key in fused if key in docs_by_key]
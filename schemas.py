@@ -0,0 +1,48 @@
+from typing import List, Literal
+from pydantic import BaseModel, Field, ValidationError
+
+AnswerKey = Literal["A", "B", "C", "D"]
+
+
+class QuestionOptions(BaseModel):
+    A: str = Field(min_length=1)
+    B: str = Field(min_length=1)
+    C: str = Field(min_length=1)
+    D: str = Field(min_length=1)
+
+
+class GeneratedQuestion(BaseModel):
+    """Schema einer generierten Prüfungsfrage"""
+    question: str = Field(min_length=1)
+    options: QuestionOptions
+    correct_answers: List[AnswerKey] = Field(min_length=1, max_length=4)
+
+
+class SinglePassQuestion(GeneratedQuestion):
+    """Schema des Single-Pass-Modus mit Begründung der korrekten Antworten"""
+    justification: str = Field(min_length=1)
+
+
+class ValidationResult(BaseModel):
+    """Schema der Antwort auf den Validierungs-Prompt"""
+    correct_answers: List[AnswerKey]
+    explanation: str = ""
+
+
+def validate_structured_data(schema, data):
+    """Validiert bereits geparste Daten gegen das Schema; None bei Abweichungen"""
+    try:
+        return schema.model_validate(data).model_dump()
+    except ValidationError:
+        return None
+
+
+def parse_structured_response(schema, response):
+    """
+    Validiert eine LLM-Antwort gegen das Schema.
+    Returns: dict oder None, wenn die Antwort nicht dem Schema entspricht
+    """
+    try:
+        return schema.model_validate_json(response).model_dump()
+    except ValidationError:
+        return None
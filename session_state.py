@@ -0,0 +1,49 @@
+from utils import get_question_type_code
+from chunk_sampler import CoverageTracker
+from dedup import QuestionDedupIndex
+from llm_client import PRIORITY_LIVE
+
+
+class TrainerSession:
+    """
+    Zustand des Trainers für genau eine Gradio-Sitzung.
+    Wird als gr.State pro Nutzer gehalten, damit sich mehrere Studierende
+    Fragen-Queue und korrekte Antworten nicht gegenseitig überschreiben.
+    """
+    def __init__(self, question_language="de"):
+        self.current_question = {
+            "options": {},
+            "correct_answers": [],
+            "selected_answers": []
+        }
+        self.question_language = question_language
+        self.attempt_count = 0
+        self.question_queue = []
+        self.current_question_index = 0
+        self.total_questions = 0
+        self.active_output = "auto"
+        self.coverage = CoverageTracker()
+        self.seen_questions = QuestionDedupIndex()
+        self.llm_priority = PRIORITY_LIVE
+
+    def reset_queue(self, total_questions, active_output):
+        """Setzt die Fragen-Queue für eine neue Fragerunde zurück"""
+        self.question_queue = []
+        self.current_question_index = 0
+        self.total_questions = int(total_questions)
+        self.attempt_count = 0
+        self.active_output = active_output
+
+    def load_question(self, question_data):
+        """Übernimmt eine Frage aus der Queue als aktuelle Frage"""
+        self.current_question["options"] = question_data["options"]
+        self.current_question["correct_answers"] = question_data.get("correct_answers", [])
+        self.current_question["question_type"] = get_question_type_code(
+            question_data.get("question_type", "Multiple Choice (MC)")
+        )
+        self.attempt_count = 0
+
+    def add_to_queue(self, question_data):
+        """Hängt eine Frage an die Queue an und merkt sie für die Duplikaterkennung"""
+        self.question_queue.append(question_data)
+        self.seen_questions.add(question_data["question_text"], question_data["question_text"])
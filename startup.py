@@ -0,0 +1,39 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    """Misst die Dauer der einzelnen Startphasen und vergleicht sie mit einem Zielwert"""
+    def __init__(self, target_seconds=None):
+        self.target_seconds = target_seconds
+        self.start_time = time.perf_counter()
+        self.phases = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        phase_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - phase_start
+            with self.lock:
+                self.phases.append((name, duration))
+            print(f"[Start] {name}: {duration:.2f}s")
+
+    def elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    def report(self, label="Start abgeschlossen"):
+        """Gibt alle gemessenen Phasen und die Gesamtdauer aus"""
+        total = self.elapsed()
+        with self.lock:
+            phases = list(self.phases)
+
+        print(f"[Start] {label} nach {total:.2f}s")
+        for name, duration in phases:
+            print(f"  - {name}: {duration:.2f}s")
+        if self.target_seconds is not None and total > self.target_seconds:
+            print(f"[Start] Zielwert von {self.target_seconds:.0f}s überschritten")
+        return total
@@ -1,41 +1,179 @@
-from langchain_ollama import OllamaLLM
-from language_utils import detect_language, format_response_by_language
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from language_utils import detect_language, format_answer_by_language, format_response_by_language, get_error_message, is_insufficient_answer
 from prompts import get_answer_prompt
+from chunk_sampler import ChunkIndex
+from retrieval import hybrid_search
+from schemas import GeneratedQuestion, SinglePassQuestion, ValidationResult
+from llm_client import LLMClient, LLMOverloadedError, PRIORITY_INTERACTIVE, PriorityScheduler
+from llm_backends import create_llm
+from llm_cache import llm_namespace
+
+DEFAULT_LLM_MODELS = {
+    "answer": "llama3.2",
+    "question": "llama3.2",
+    "topic": "llama3.2",
+    "variation": "llama3.2",
+    "validation": "llama3.2"
+}
+
+
+def _is_cacheable_answer(answer):
+    """Antworten ohne ausreichenden Kontext nicht persistent cachen (wie beim AnswerCache)"""
+    return not is_insufficient_answer(answer, 'de') and not is_insufficient_answer(answer, 'en')
+
 
 class OptimizedBS2Tutor:
-    def __init__(self, vectorstore):
+    def __init__(self, vectorstore, answer_cache=None, llm_concurrency=4, llm_backend="ollama", llm_models=None, backend_options=None, response_cache=None,
+                 lexical_index=None, retrieval_k=5, reranker=None, rerank_candidates=30):
+        """
+        llm_backend: Name eines registrierten Backends (siehe llm_backends.LLM_BACKENDS)
+        llm_models: Modell pro Aufgabe (answer, question, topic, variation, validation);
+            günstige Aufgaben können so an ein kleineres Modell gehen
+        backend_options: zusätzliche Parameter für das Backend, z.B. latency_seconds beim Stub
+        response_cache: persistenter LLMResponseCache für alle LLM-Aufrufe (optional)
+        lexical_index: BM25Index für die hybride Suche; ohne Index rein dichte Suche
+        retrieval_k: Anzahl der Chunks im Antwort-Prompt ohne Re-Ranking
+        reranker: bewertet rerank_candidates Kandidaten neu und behält so viele, wie ins Token-Budget passen
+        """
         self.vectorstore = vectorstore
-        self.llm = OllamaLLM(model="llama3.2", temperature=0.0)
-        self.last_correct_answers = []
+        self.llm_scheduler = PriorityScheduler(llm_concurrency)
+        self.retrieval_executor = ThreadPoolExecutor(max_workers=llm_concurrency, thread_name_prefix="retrieval")
+        self.llm_backend = llm_backend
+        self.llm_models = dict(DEFAULT_LLM_MODELS, **(llm_models or {}))
+        self.backend_options = backend_options or {}
+        self.response_cache = response_cache
+        self.llm = self._create_llm("answer", cacheable=_is_cacheable_answer)
+        self.question_llm = self._create_llm("question", format=GeneratedQuestion.model_json_schema())
+        self.single_pass_llm = self._create_llm("question", format=SinglePassQuestion.model_json_schema())
+        self.topic_llm = self._create_llm("topic")
+        self.variation_llm = self._create_llm("variation")
+        self.validation_llm = self._create_llm("validation", format=ValidationResult.model_json_schema())
+        self.answer_cache = answer_cache
+        self.chunk_index = ChunkIndex(vectorstore)
+        self.lexical_index = lexical_index
+        self.retrieval_k = retrieval_k
+        self.reranker = reranker
+        self.rerank_candidates = rerank_candidates
 
-    def ask_question(self, question, k=5):
+    def _create_llm(self, task, cacheable=None, **kwargs):
+        """Erstellt den LLM-Client für eine Aufgabe; alle Clients teilen sich den Scheduler und damit das Parallelitätslimit"""
+        options = dict(self.backend_options, temperature=0.0, **kwargs)
+        llm = create_llm(
+            self.llm_backend,
+            self.llm_models[task],
+            max_connections=self.llm_scheduler.max_concurrency,
+            **options
+        )
+        return LLMClient(
+            llm,
+            self.llm_scheduler,
+            response_cache=self.response_cache,
+            cache_namespace=llm_namespace(self.llm_backend, self.llm_models[task], options),
+            cacheable=cacheable
+        )
+
+    def ask_question(self, question, k=None, session_id=None):
         """
-        Beantwortet eine Frage basierend auf dem Hauptskript
+        Beantwortet eine Frage basierend auf dem Hauptskript.
+        session_id: Kennung der Sitzung für die faire Verteilung der Chat-Slots im Scheduler
         """
         try:
-            language = detect_language(question)
+            language, cached, main_docs, query_embedding = self._prepare_answer(question, k)
+            if cached is not None:
+                return cached
 
-            main_docs = self.vectorstore.similarity_search(
-                question,
-                k=k,
-                filter={"source_type": "Hauptskript"}
-            )
-            print(f"Gefunden: {len(main_docs)} relevante Dokumente im Hauptskript")
             print("Generiere Antwort basierend auf Hauptskript...")
-            answer, detected_language = self._generate_answer(question, main_docs)
-            print("Antwort generiert!")
+            start_time = time.perf_counter()
+            prompt = get_answer_prompt(language, question, main_docs)
+            answer = self.llm.invoke(prompt, priority=PRIORITY_INTERACTIVE, session_id=session_id)
+            return self._finish_answer(question, language, answer, main_docs, start_time, query_embedding)
+        except Exception as e:
+            return self._error_response(question, e)
 
-            return self._format_response(answer, detected_language, main_docs, "Hauptskript")
+    async def ask_question_stream_async(self, question, k=None, session_id=None):
+        """
+        Asynchrone Streaming-Variante für async Gradio-Handler: Cache-Lookup und Retrieval
+        laufen im eigenen Retrieval-Executor, die Generierung über den asynchronen LLM-Client
+        """
+        try:
+            loop = asyncio.get_running_loop()
+            language, cached, main_docs, query_embedding = await loop.run_in_executor(
+                self.retrieval_executor, self._prepare_answer, question, k
+            )
+            if cached is not None:
+                yield cached
+                return
 
+            print("Generiere Antwort (Streaming) basierend auf Hauptskript...")
+            start_time = time.perf_counter()
+            prompt = get_answer_prompt(language, question, main_docs)
+            answer = ""
+            async for token in self.llm.astream(prompt, session_id=session_id):
+                answer += token
+                yield format_answer_by_language(language, answer)
+            yield self._finish_answer(question, language, answer, main_docs, start_time, query_embedding)
         except Exception as e:
-            return f"Fehler bei der Verarbeitung der Frage: {str(e)}"
+            yield self._error_response(question, e)
 
-    def _generate_answer(self, question, documents):
-        """Generiert eine Antwort basierend auf den relevanten Dokumenten"""
+    def _prepare_answer(self, question, k=None):
+        """
+        Gemeinsame Vorstufe der Antwortpfade: Sprache erkennen, Antwort-Cache prüfen, Retrieval.
+        Returns: (language, formatierte Cache-Antwort oder None, Dokumente, Query-Embedding)
+        """
         language = detect_language(question)
-        prompt = get_answer_prompt(language, question, documents)
-        answer = self.llm.invoke(prompt)
-        return answer, language
+        cached, query_embedding = self._lookup_cached_answer(question, language)
+        if cached is not None:
+            return language, self._format_response(cached["answer"], language, cached["documents"], "Hauptskript"), None, query_embedding
+        main_docs = self._retrieve_documents(question, k, query_embedding)
+        return language, None, main_docs, query_embedding
+
+    def _finish_answer(self, question, language, answer, documents, start_time, query_embedding):
+        """Legt die fertige Antwort im Antwort-Cache ab und ergänzt die Quellenangaben"""
+        print("Antwort generiert!")
+        self._store_cached_answer(question, language, answer, documents, time.perf_counter() - start_time, query_embedding)
+        return self._format_response(answer, language, documents, "Hauptskript")
+
+    def _error_response(self, question, error):
+        """Fehlermeldung der Antwortpfade; Überlastung bekommt einen eigenen Hinweis"""
+        if isinstance(error, LLMOverloadedError):
+            return get_error_message(detect_language(question), "overloaded")
+        return f"Fehler bei der Verarbeitung der Frage: {str(error)}"
+
+    def _lookup_cached_answer(self, question, language):
+        """Sucht eine bereits generierte Antwort im Antwort-Cache"""
+        if self.answer_cache is None:
+            return None, None
+        cached, query_embedding = self.answer_cache.lookup(question, language)
+        if cached is not None:
+            print(self.answer_cache.format_stats())
+        return cached, query_embedding
+
+    def _store_cached_answer(self, question, language, answer, documents, generation_seconds, query_embedding):
+        """Legt eine vollständige Antwort im Antwort-Cache ab"""
+        if self.answer_cache is None or is_insufficient_answer(answer, language):
+            return
+        self.answer_cache.store(question, language, answer, documents, generation_seconds, query_embedding)
+
+    def _retrieve_documents(self, question, k=None, query_embedding=None):
+        """
+        Holt die relevanten Dokumente aus dem Hauptskript (dicht + BM25, fusioniert per RRF).
+        Mit Reranker wird eine breitere Kandidatenmenge geholt und auf das Token-Budget gekürzt;
+        ein übergebenes k begrenzt dabei die Anzahl der behaltenen Chunks.
+        """
+        main_docs = hybrid_search(
+            self.vectorstore,
+            self.lexical_index,
+            question,
+            max(self.rerank_candidates, k or 0) if self.reranker is not None else k or self.retrieval_k,
+            source_type="Hauptskript",
+            query_embedding=query_embedding
+        )
+        if self.reranker is not None:
+            main_docs = self.reranker.rerank(question, main_docs, max_chunks=k)
+        print(f"Gefunden: {len(main_docs)} relevante Dokumente im Hauptskript")
+        return main_docs
 
     def _format_response(self, answer, language, documents, source_label):
         """Formatiert die Antwort mit Quellenangaben"""
@@ -46,17 +184,7 @@ class OptimizedBS2Tutor:
         Delegiert die Fragengenerierung an den QuestionGenerator
         """
         from question_generator import QuestionGenerator
+        from session_state import TrainerSession
 
-        class TempInterface:
-            def __init__(self, tutor, language):
-                self.tutor = tutor
-                self.question_language = language
-                self.current_question = {
-                    "options": {},
-                    "correct_answers": [],
-                    "selected_answers": []
-                }
-
-        temp_interface = TempInterface(self, language)
-        generator = QuestionGenerator(temp_interface)
-        return generator.generate_question_with_language(topic, question_type)
\ No newline at end of file
+        generator = QuestionGenerator(self)
+        return generator.generate_question_with_language(TrainerSession(language), topic, question_type)
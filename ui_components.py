@@ -1,4 +1,5 @@
 import gradio as gr
+from session_state import TrainerSession
 
 def create_question_tab(interface):
     """Erstellt den Fragen-Tab"""
@@ -18,6 +19,8 @@ def create_trainer_tab(interface):
     """Erstellt den Trainer-Tab mit allen Komponenten"""
     components = {}
 
+    components["session"] = gr.State(TrainerSession())
+
     with gr.Row(equal_height=True):
         components["auto_btn"] = gr.Button("Automatische Fragen", size="lg", variant="primary")
         components["eigene_btn"] = gr.Button("Eigene Fragen", size="lg")
@@ -127,42 +130,53 @@ def create_tabs(interface):
 def register_event_handlers(interface, components):
     """Registriert alle Event-Handler für die UI-Komponenten"""
 
-    def show_auto_fragen():
-        interface.active_output = "auto"
-        return gr.update(visible=True), gr.update(visible=False), gr.update(variant="primary"), gr.update(variant="secondary")
+    def show_auto_fragen(session):
+        session.active_output = "auto"
+        return gr.update(visible=True), gr.update(visible=False), gr.update(variant="primary"), gr.update(variant="secondary"), session
 
-    def show_eigene_fragen():
-        interface.active_output = "eigene"
-        return gr.update(visible=False), gr.update(visible=True), gr.update(variant="secondary"), gr.update(variant="primary")
+    def show_eigene_fragen(session):
+        session.active_output = "eigene"
+        return gr.update(visible=False), gr.update(visible=True), gr.update(variant="secondary"), gr.update(variant="primary"), session
 
     components["auto_btn"].click(
         show_auto_fragen,
+        inputs=[components["session"]],
         outputs=[
             components["auto_fragen_bereich"],
             components["eigene_fragen_bereich"],
             components["auto_btn"],
-            components["eigene_btn"]
+            components["eigene_btn"],
+            components["session"]
         ]
     )
 
     components["eigene_btn"].click(
         show_eigene_fragen,
+        inputs=[components["session"]],
         outputs=[
             components["auto_fragen_bereich"],
             components["eigene_fragen_bereich"],
             components["auto_btn"],
-            components["eigene_btn"]
+            components["eigene_btn"],
+            components["session"]
         ]
     )
 
     components["question_language"].change(
         interface.set_question_language,
-        inputs=[components["question_language"]]
+        inputs=[components["question_language"], components["session"]],
+        outputs=[components["session"]]
     )
 
+    async def generate_auto_questions(q_type, count, session):
+        return await interface.generate_questions(q_type, count, session=session)
+
+    async def generate_eigene_questions(topic, q_type, count, session):
+        return await interface.generate_questions(q_type, count, topic, session)
+
     components["auto_question_btn"].click(
-        lambda q_type, count: interface.generate_questions(q_type, count),
-        inputs=[components["auto_question_type"], components["question_count"]],
+        generate_auto_questions,
+        inputs=[components["auto_question_type"], components["question_count"], components["session"]],
         outputs=[
             components["auto_question_output"],
             components["answer_group"],
@@ -170,13 +184,14 @@ def register_event_handlers(interface, components):
             components["result"],
             components["attempt_counter"],
             components["progress_display"],
-            components["next_btn"]
+            components["next_btn"],
+            components["session"]
         ]
     )
 
     components["eigene_question_btn"].click(
-        lambda topic, q_type, count: interface.generate_questions(q_type, count, topic),
-        inputs=[components["eigene_topic"], components["eigene_type"], components["eigene_question_count"]],
+        generate_eigene_questions,
+        inputs=[components["eigene_topic"], components["eigene_type"], components["eigene_question_count"], components["session"]],
         outputs=[
             components["eigene_question_output"],
             components["answer_group"],
@@ -184,18 +199,20 @@ def register_event_handlers(interface, components):
             components["result"],
             components["attempt_counter"],
             components["eigene_progress_display"],
-            components["next_btn"]
+            components["next_btn"],
+            components["session"]
         ]
     )
 
     components["check_btn"].click(
         interface.answer_handler.check_answer_with_attempts,
-        inputs=[components["options"], components["attempt_counter"]],
-        outputs=[components["result"], components["attempt_counter"], components["next_btn"]]
+        inputs=[components["options"], components["attempt_counter"], components["session"]],
+        outputs=[components["result"], components["attempt_counter"], components["next_btn"], components["session"]]
     )
 
     components["next_btn"].click(
         interface.answer_handler.handle_next_question,
+        inputs=[components["session"]],
         outputs=[
             components["auto_question_output"],
             components["eigene_question_output"],
@@ -205,6 +222,7 @@ def register_event_handlers(interface, components):
             components["attempt_counter"],
             components["progress_display"],
             components["eigene_progress_display"],
-            components["next_btn"]
+            components["next_btn"],
+            components["session"]
         ]
     )
\ No newline at end of file
@@ -1,3 +1,8 @@
+import re
+from retrieval import hybrid_search
+
+_TOKEN_ESTIMATE_PATTERN = re.compile(r'\w+|[^\w\s]')
+
 def format_choices(options):
     """Formatiert Antwortoptionen für die Anzeige"""
     return [f"{k}) {v}" for k, v in options.items()]
@@ -27,16 +32,10 @@ def error_handler(e, language="de"):
     else:
         return f"Error: {str(e)}"
 
-def get_relevant_documents(vectorstore, query, k=2, filter_type=None):
-    """Zentrale Funktion zum Abrufen relevanter Dokumente"""
-    filter_dict = {"source_type": filter_type} if filter_type else None
+def get_relevant_documents(vectorstore, query, k=2, filter_type=None, lexical_index=None):
+    """Zentrale Funktion zum Abrufen relevanter Dokumente (hybrid mit BM25, sofern ein lexikalischer Index vorliegt)"""
     try:
-        docs = vectorstore.similarity_search(
-            query,
-            k=k,
-            filter=filter_dict
-        )
-        return docs
+        return hybrid_search(vectorstore, lexical_index, query, k, source_type=filter_type)
     except Exception as e:
         print(f"Fehler beim Abrufen von Dokumenten: {e}")
         return []
@@ -60,4 +59,20 @@ def extract_key_topic(text, llm):
         return topic
     except Exception as e:
         print(f"Fehler bei der Themenextraktion: {e}")
-        return "Business Software"
\ No newline at end of file
+        return "Business Software"
+
+def count_tokens(text):
+    """
+    Schätzt die Tokenanzahl für den Llama-3-Tokenizer ohne das Modell zu laden:
+    Satzzeichen zählen als ein Token, Wörter als ein Token je angefangene 4 Zeichen
+    """
+    return sum((len(piece) + 3) // 4 for piece in _TOKEN_ESTIMATE_PATTERN.findall(text))
+
+def truncate_to_tokens(text, token_budget):
+    """Kürzt Text an einer Wortgrenze auf höchstens token_budget Tokens (Schätzung wie count_tokens)"""
+    used_tokens = 0
+    for match in _TOKEN_ESTIMATE_PATTERN.finditer(text):
+        used_tokens += (len(match.group()) + 3) // 4
+        if used_tokens > token_budget:
+            return text[:match.start()].rstrip()
+    return text
@@ -0,0 +1,262 @@
+import os
+import threading
+import numpy as np
+from langchain_core.documents import Document
+
+STORAGE_DTYPES = {
+    "float32": np.float32,
+    "float16": np.float16,
+    "int8": np.int8
+}
+SCORE_BLOCK_ROWS = 4096
+
+
+class NumpyVectorIndex:
+    """
+    Exakte Vektorsuche über eine zusammenhängende NumPy-Matrix normalisierter Embeddings.
+    Top-k ergibt sich aus einem Matrix-Vektor-Produkt plus argpartition; der Filter auf
+    source_type läuft über vorberechnete boolesche Masken. Für Korpora mit wenigen
+    tausend Chunks ist das schneller als ein ANN-Index und ohne Recall-Verlust.
+
+    Im Modus int8 werden die Vektoren pro Dimension skalar quantisiert (ein Viertel des
+    Speichers von float32). Mit rerank_vectors_path liegen die float32-Vektoren zusätzlich
+    als memory-mapped Datei auf der Festplatte; die rerank_factor * k besten Kandidaten
+    werden damit exakt neu bewertet.
+    """
+    def __init__(self, ids, vectors, metadatas, texts, storage="float32", rerank_vectors_path=None, rerank_factor=4):
+        if storage not in STORAGE_DTYPES:
+            raise ValueError(f"Unbekannter Speichermodus: {storage} (verfügbar: {', '.join(STORAGE_DTYPES)})")
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2:
+            vectors = vectors.reshape(len(ids), -1) if len(ids) else np.zeros((0, 0), dtype=np.float32)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        self.storage = storage
+        self.ids = list(ids)
+        self.metadatas = [dict(metadata or {}) for metadata in metadatas]
+        self.texts = list(texts)
+        self.rerank_factor = rerank_factor
+        self.rerank_vectors = None
+
+        if storage == "int8":
+            self.mins = vectors.min(axis=0) if len(vectors) else np.zeros(vectors.shape[1], dtype=np.float32)
+            spans = (vectors.max(axis=0) - self.mins) if len(vectors) else np.ones(vectors.shape[1], dtype=np.float32)
+            self.scales = np.maximum(spans, 1e-12) / 255.0
+            codes = np.round((vectors - self.mins) / self.scales) - 128
+            self.matrix = np.ascontiguousarray(np.clip(codes, -128, 127), dtype=np.int8)
+            if rerank_vectors_path is not None and len(vectors):
+                self.rerank_vectors = self._write_rerank_vectors(rerank_vectors_path, vectors)
+        else:
+            self.matrix = np.ascontiguousarray(vectors, dtype=STORAGE_DTYPES[storage])
+
+        source_types = np.array([metadata.get('source_type', 'Unknown') for metadata in self.metadatas], dtype=object)
+        self.masks = {source_type: source_types == source_type for source_type in set(source_types)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def _write_rerank_vectors(path, vectors):
+        """Schreibt die float32-Vektoren für das Re-Ranking in eine memory-mapped Datei"""
+        tmp_path = f"{path}.tmp"
+        vectors.astype(np.float32).tofile(tmp_path)
+        os.replace(tmp_path, path)
+        return np.memmap(path, dtype=np.float32, mode='r', shape=vectors.shape)
+
+    def memory_bytes(self):
+        """Im Arbeitsspeicher gehaltene Bytes der Vektoren (ohne memory-mapped Re-Ranking-Datei)"""
+        if self.storage == "int8":
+            return self.matrix.nbytes + self.mins.nbytes + self.scales.nbytes
+        return self.matrix.nbytes
+
+    def _scores(self, queries):
+        """
+        Kosinus-Ähnlichkeiten (Anfragen × Chunks). float16 und int8 werden blockweise
+        in float32 gerechnet; bei int8 wird die Skalierung in die Anfrage gezogen.
+        """
+        if self.matrix.dtype == np.float32:
+            return queries @ self.matrix.T
+
+        offsets = np.zeros(queries.shape[0], dtype=np.float32)
+        if self.storage == "int8":
+            offsets = queries @ (self.mins + 128 * self.scales)
+            queries = queries * self.scales
+        scores = np.empty((queries.shape[0], len(self.ids)), dtype=np.float32)
+        for start in range(0, len(self.ids), SCORE_BLOCK_ROWS):
+            block = self.matrix[start:start + SCORE_BLOCK_ROWS].astype(np.float32)
+            scores[:, start:start + SCORE_BLOCK_ROWS] = queries @ block.T + offsets[:, None]
+        return scores
+
+    @staticmethod
+    def _top_k(scores, k):
+        """Zeilen und Scores der k besten Treffer pro Anfrage, absteigend sortiert"""
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+    def search_batch(self, query_embeddings, k, source_type=None):
+        """
+        Sucht für mehrere Anfragen gleichzeitig (ein Matrixprodukt für alle Anfragen).
+        Returns: pro Anfrage eine Liste von (Zeile, Ähnlichkeit), absteigend sortiert
+        """
+        if not self.ids:
+            return [[] for _ in range(len(query_embeddings))]
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(-1, self.matrix.shape[1])
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+        scores = self._scores(queries)
+        if source_type is not None:
+            mask = self.masks.get(source_type)
+            if mask is None:
+                return [[] for _ in range(len(queries))]
+            scores[:, ~mask] = -np.inf
+            k = min(k, int(mask.sum()))
+        k = min(k, len(self.ids))
+        if k <= 0:
+            return [[] for _ in range(len(queries))]
+
+        if self.rerank_vectors is None:
+            top, top_scores = self._top_k(scores, k)
+            return [list(zip(rows.tolist(), row_scores.tolist())) for rows, row_scores in zip(top, top_scores)]
+
+        candidate_k = min(k * self.rerank_factor, scores.shape[1])
+        if source_type is not None:
+            candidate_k = min(candidate_k, int(self.masks[source_type].sum()))
+        candidates, _ = self._top_k(scores, candidate_k)
+        results = []
+        for query, rows in zip(queries, candidates):
+            rows = np.sort(rows)
+            exact = self.rerank_vectors[rows] @ query
+            order = np.argsort(-exact)[:k]
+            results.append(list(zip(rows[order].tolist(), exact[order].tolist())))
+        return results
+
+    def search(self, query_embedding, k, source_type=None):
+        return self.search_batch([query_embedding], k, source_type)[0]
+
+    def document(self, row):
+        metadata = dict(self.metadatas[row])
+        metadata['chunk_id'] = self.ids[row]
+        return Document(page_content=self.texts[row], metadata=metadata)
+
+    @classmethod
+    def from_collection(cls, collection, storage="float32", **kwargs):
+        """Lädt alle Vektoren, Texte und Metadaten einer Chroma-Collection"""
+        result = collection.get(include=["embeddings", "documents", "metadatas"])
+        return cls(result["ids"], result["embeddings"], result["metadatas"], result["documents"], storage, **kwargs)
+
+
+def recall_at_k(index, reference, k=10, sample_size=200, seed=0):
+    """
+    Anteil der exakten Top-k (reference, float32) die auch index findet.
+    Als Anfragen dienen zufällige Chunk-Vektoren; der Chunk selbst zählt nicht als Treffer.
+    """
+    if len(reference) < 2:
+        return 1.0
+    rows = np.random.default_rng(seed).choice(len(reference), size=min(sample_size, len(reference)), replace=False)
+    queries = reference.matrix[rows]
+    found = index.search_batch(queries, k + 1)
+    expected = reference.search_batch(queries, k + 1)
+    hits = total = 0
+    for row, found_hits, expected_hits in zip(rows, found, expected):
+        expected_rows = [hit_row for hit_row, _ in expected_hits if hit_row != row][:k]
+        found_rows = {hit_row for hit_row, _ in found_hits if hit_row != row}
+        hits += sum(1 for hit_row in expected_rows if hit_row in found_rows)
+        total += len(expected_rows)
+    return hits / total if total else 1.0
+
+
+def format_index_report(index, reference, k=10):
+    """Speicherbedarf und Recall@k eines (quantisierten) Index gegenüber float32"""
+    recall = recall_at_k(index, reference, k)
+    return (
+        f"Vektorindex {index.storage}: {index.memory_bytes() / 2**20:.1f} MiB "
+        f"(float32: {reference.memory_bytes() / 2**20:.1f} MiB), "
+        f"Recall@{k} {recall:.3f}" + (" mit Re-Ranking" if index.rerank_vectors is not None else "")
+    )
+
+
+class NumpyVectorStore:
+    """
+    Ersatz für den Chroma-Vektorspeicher bei der Suche: similarity_search und Co.
+    laufen über den NumpyVectorIndex, alles andere (Collection, Embeddings, Ingestion)
+    wird an Chroma weitergereicht. Nach add_documents/delete wird der Index bei der
+    nächsten Suche neu geladen. Mit report_k wird für quantisierte Modi beim Laden
+    Speicherbedarf und Recall@k gegenüber float32 ausgegeben.
+    """
+    def __init__(self, vectorstore, storage="float32", rerank_vectors_path=None, rerank_factor=4, report_k=None):
+        self.vectorstore = vectorstore
+        self.storage = storage
+        self.rerank_vectors_path = rerank_vectors_path
+        self.rerank_factor = rerank_factor
+        self.report_k = report_k
+        self.lock = threading.Lock()
+        self.index = None
+        self.stale = True
+        self._ensure_index()
+
+    def __getattr__(self, name):
+        return getattr(self.vectorstore, name)
+
+    def _ensure_index(self):
+        with self.lock:
+            if self.stale:
+                result = self.vectorstore._collection.get(include=["embeddings", "documents", "metadatas"])
+                data = (result["ids"], result["embeddings"], result["metadatas"], result["documents"])
+                self.index = NumpyVectorIndex(
+                    *data,
+                    storage=self.storage,
+                    rerank_vectors_path=self.rerank_vectors_path,
+                    rerank_factor=self.rerank_factor
+                )
+                self.stale = False
+                print(f"NumPy-Vektorindex geladen: {len(self.index)} Vektoren ({self.storage}, "
+                      f"{self.index.memory_bytes() / 2**20:.1f} MiB)")
+                if self.report_k and self.storage != "float32":
+                    print(format_index_report(self.index, NumpyVectorIndex(*data), self.report_k))
+            return self.index
+
+    def add_documents(self, documents, **kwargs):
+        ids = self.vectorstore.add_documents(documents, **kwargs)
+        self.stale = True
+        return ids
+
+    def delete(self, ids=None, **kwargs):
+        result = self.vectorstore.delete(ids=ids, **kwargs)
+        self.stale = True
+        return result
+
+    @staticmethod
+    def _source_type(filter):
+        """Nur Filter auf source_type werden über die Masken abgebildet; None bei anderen Filtern"""
+        if not filter:
+            return True, None
+        if set(filter) == {"source_type"} and isinstance(filter["source_type"], str):
+            return True, filter["source_type"]
+        return False, None
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None):
+        supported, source_type = self._source_type(filter)
+        if not supported:
+            return self.vectorstore.similarity_search_by_vector_with_relevance_scores(embedding, k=k, filter=filter)
+        index = self._ensure_index()
+        # Wie Chroma mit hnsw:space=cosine: Kosinus-Distanz, kleiner ist besser
+        return [(index.document(row), 1.0 - score) for row, score in index.search(embedding, k, source_type)]
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_by_vector_with_score(self.vectorstore.embeddings.embed_query(query), k, filter)
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def batch_similarity_search(self, queries, k=4, filter=None):
+        """Batch-API: bettet alle Anfragen ein und sucht mit einem einzigen Matrixprodukt"""
+        supported, source_type = self._source_type(filter)
+        if not supported:
+            return [self.vectorstore.similarity_search(query, k=k, filter=filter) for query in queries]
+        embeddings = [self.vectorstore.embeddings.embed_query(query) for query in queries]
+        index = self._ensure_index()
+        return [[index.document(row) for row, _ in hits] for hits in index.search_batch(embeddings, k, source_type)]